@@ -0,0 +1,239 @@
+# api.py - Headless HTTP/JSON service for PhoneBook
+import argparse
+import hashlib
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+from database import PhoneBookDB, SORT_FIELDS, SEARCH_FIELDS, MATCH_MODES, FACET_FIELDS, DUPLICATE_MODES
+from export import iter_export, FORMATS as EXPORT_FORMATS
+from maintenance import Maintenance, MaintenanceScheduler
+from storage import check_data_dirs
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class PhoneBookAPIHandler(BaseHTTPRequestHandler):
+    # One instance per request; self.server.db is shared (it opens a connection per call)
+    protocol_version = "HTTP/1.1"
+    server_version = "PhoneBookAPI/1.0"
+
+    # ---- helpers ----
+
+    def send_json(self, status, payload, etag=True):
+        # Send a JSON body, answering 304 when the client already has it
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        tag = None
+        if etag and status == 200:
+            tag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if tag in self.headers.get("If-None-Match", ""):
+                self.send_response(304)
+                self.send_header("ETag", tag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if tag:
+            self.send_header("ETag", tag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": message}, etag=False)
+
+    def send_stream(self, content_type, chunks):
+        # Send an iterable of bytes with chunked transfer encoding
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def read_json(self):
+        # Parse the request body, or None if it is not valid JSON or its
+        # length is unusable (the callers answer 400 either way)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body can't be skipped without a length; don't reuse the connection
+            self.close_connection = True
+            return None
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            return None
+
+    def page_params(self, query):
+        # limit/offset from the query string, clamped
+        try:
+            limit = min(max(int(query.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+            offset = max(int(query.get("offset", 0)), 0)
+        except ValueError:
+            return None, None
+        return limit, offset
+
+    def route(self):
+        # Split the URL into path parts and a flat query dict
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return parts, query
+
+    # ---- verbs ----
+
+    def do_GET(self):
+        parts, query = self.route()
+        db = self.server.db
+
+        if parts == ["contacts"]:
+            limit, offset = self.page_params(query)
+            if limit is None:
+                return self.send_error_json(400, "Invalid limit/offset")
+            sort_by = query.get("sort", "last_name")
+            if sort_by not in SORT_FIELDS:
+                return self.send_error_json(400, f"Invalid sort: {sort_by}")
+            contacts, total = db.get_page(sort_by, limit, offset)
+            return self.send_json(200, {"total": total, "limit": limit, "offset": offset, "contacts": contacts})
+
+        if parts == ["contacts", "search"]:
+            limit, offset = self.page_params(query)
+            if limit is None:
+                return self.send_error_json(400, "Invalid limit/offset")
+            match = query.get("match", "contains")
+            if match not in MATCH_MODES:
+                return self.send_error_json(400, f"Invalid match: {match}")
+            filters = {k: v for k, v in query.items() if k in SEARCH_FIELDS}
+            contacts = db.search(filters, limit=limit, offset=offset, match=match)
+            return self.send_json(200, {"limit": limit, "offset": offset, "contacts": contacts})
+
+        if len(parts) == 2 and parts[0] == "contacts" and parts[1].isdigit():
+            contact = db.get_by_id(int(parts[1]))
+            if not contact:
+                return self.send_error_json(404, "Not found")
+            return self.send_json(200, contact)
+
+        if len(parts) == 3 and parts[:2] == ["contacts", "phone"]:
+            return self.send_json(200, {"contacts": db.get_by_phone(parts[2])})
+
+        if len(parts) == 2 and parts[0] == "facets":
+            if parts[1] not in FACET_FIELDS:
+                return self.send_error_json(404, f"No facets for {parts[1]}")
+            facets = [{"value": value, "count": count} for value, count in db.facets(parts[1])]
+            return self.send_json(200, {"field": parts[1], "facets": facets})
+
+        if parts == ["export"]:
+            fmt = query.get("format", "jsonl")
+            if fmt not in EXPORT_FORMATS:
+                return self.send_error_json(400, f"Invalid format: {fmt}")
+            filters = {k: v for k, v in query.items() if k in SEARCH_FIELDS}
+            content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+            return self.send_stream(f"{content_type}; charset=utf-8", iter_export(db, fmt, filters))
+
+        if parts == ["maintenance"]:
+            return self.send_json(200, Maintenance(db).load_status(), etag=False)
+
+        self.send_error_json(404, "Unknown endpoint")
+
+    def do_POST(self):
+        # Bulk create: {"contacts": [{...}, ...], "on_duplicate": "skip"|"update"}
+        parts, _ = self.route()
+        if parts != ["contacts", "bulk"]:
+            return self.send_error_json(404, "Unknown endpoint")
+        payload = self.read_json()
+        if not self.contact_list(payload):
+            return self.send_error_json(400, "Expected {\"contacts\": [{...}, ...]}")
+        on_duplicate = payload.get("on_duplicate", "skip")
+        if on_duplicate not in DUPLICATE_MODES:
+            return self.send_error_json(400, f"on_duplicate must be one of {DUPLICATE_MODES}")
+        added, duplicates, errors = self.server.db.import_many(payload["contacts"], on_duplicate)
+        self.send_json(200, {"added": added, "duplicates": duplicates, "errors": errors}, etag=False)
+
+    def do_PATCH(self):
+        # Bulk update: {"contacts": [{"id": 1, ...}, ...]}, or one change for
+        # many contacts: {"set": {...}, "ids": [...]} / {"set": {...}, "filters": {...}}
+        parts, _ = self.route()
+        if parts != ["contacts", "bulk"]:
+            return self.send_error_json(404, "Unknown endpoint")
+        payload = self.read_json()
+        if isinstance(payload, dict) and isinstance(payload.get("set"), dict):
+            target = self.bulk_target(payload)
+            if target is None:
+                return self.send_error_json(400, "Expected \"ids\": [int, ...] or \"filters\": {...}")
+            updated, message = self.server.db.update_many(payload["set"], **target)
+            return self.send_json(200, {"updated": updated, "message": message}, etag=False)
+        if not self.contact_list(payload):
+            return self.send_error_json(400, "Expected {\"contacts\": [{...}, ...]}")
+        updated, errors = self.server.db.update_contacts(payload["contacts"])
+        self.send_json(200, {"updated": updated, "errors": errors}, etag=False)
+
+    def do_DELETE(self):
+        # Bulk delete: {"ids": [1, 2, ...]} or {"filters": {...}}, or a single /contacts/<id>
+        parts, _ = self.route()
+        db = self.server.db
+
+        if len(parts) == 2 and parts[0] == "contacts" and parts[1].isdigit():
+            deleted, message = db.delete(int(parts[1]))
+            return self.send_json(200 if deleted else 404, {"deleted": int(deleted), "message": message}, etag=False)
+
+        if parts != ["contacts", "bulk"]:
+            return self.send_error_json(404, "Unknown endpoint")
+        payload = self.read_json()
+        target = self.bulk_target(payload) if isinstance(payload, dict) else None
+        if target is None:
+            return self.send_error_json(400, "Expected {\"ids\": [int, ...]} or {\"filters\": {...}}")
+        self.send_json(200, {"deleted": db.delete_many(**target)}, etag=False)
+
+    def contact_list(self, payload):
+        # True if payload is {"contacts": [...]} with an object for every contact
+        contacts = payload.get("contacts") if isinstance(payload, dict) else None
+        return isinstance(contacts, list) and all(isinstance(c, dict) for c in contacts)
+
+    def bulk_target(self, payload):
+        # delete_many/update_many keyword arguments from "ids" or "filters"/"match"
+        ids = payload.get("ids")
+        if isinstance(ids, list) and all(isinstance(i, int) for i in ids):
+            return {"ids": ids}
+        filters = payload.get("filters")
+        if isinstance(filters, dict) and payload.get("match", "contains") in MATCH_MODES:
+            return {"filters": filters, "match": payload.get("match", "contains")}
+        return None
+
+def make_server(db, host="127.0.0.1", port=8551):
+    # Build a threaded server bound to a PhoneBookDB
+    server = ThreadingHTTPServer((host, port), PhoneBookAPIHandler)
+    server.daemon_threads = True
+    server.db = db
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PhoneBook headless JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8551)
+    parser.add_argument("--db", default="phonebook.db")
+    args = parser.parse_args()
+
+    server = make_server(PhoneBookDB(args.db), args.host, args.port)
+    if not server.db.memory:
+        check_data_dirs({"database (PHONEBOOK_DATA_DIR)": server.db.db_name})
+    MaintenanceScheduler(Maintenance(server.db)).start()
+    print(f"API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# autocomplete.py - In-memory prefix suggestions for the search fields
+import bisect
+import heapq
+import threading
+
+from database import SEARCH_FIELDS, NORM_COLUMNS
+from normalize import normalize_field
+
+KEY_SEP = "\x00"
+KEY_END = "\U0010ffff"
+# Prefix ranges wider than this are not ranked by count (too slow per keystroke);
+# the first k values in sorted order are returned instead
+SCAN_LIMIT = 5000
+CACHE_SIZE = 256
+
+
+class FieldSuggester:
+    # Distinct values of one field. keys is a sorted list of
+    # "<word suffix><KEY_SEP><normalized value>" so that a bisect over it finds
+    # every value containing a word that starts with the typed prefix.
+
+    def __init__(self, field):
+        self.field = field
+        self.counts = {}
+        self.display = {}
+        self.keys = []
+        self._cache = {}
+
+    def _tokens(self, norm):
+        # The whole value plus the value from each later word onwards
+        yield norm
+        for i, ch in enumerate(norm):
+            if ch == " " and i + 1 < len(norm):
+                yield norm[i + 1:]
+
+    def add(self, value, count=1):
+        norm = normalize_field(self.field, value)
+        if not norm:
+            return
+        if norm in self.counts:
+            self.counts[norm] += count
+        else:
+            self.counts[norm] = count
+            self.display[norm] = value
+            for token in set(self._tokens(norm)):
+                bisect.insort(self.keys, token + KEY_SEP + norm)
+        self._cache.clear()
+
+    def add_many(self, rows):
+        # Bulk load (normalized value, display value, count) rows; one sort
+        # instead of an insort each
+        new_keys = []
+        for norm, value, count in rows:
+            if not norm:
+                continue
+            if norm in self.counts:
+                self.counts[norm] += count
+                continue
+            self.counts[norm] = count
+            self.display[norm] = value
+            new_keys.extend(token + KEY_SEP + norm for token in set(self._tokens(norm)))
+        self.keys.extend(new_keys)
+        self.keys.sort()
+        self._cache.clear()
+
+    def remove(self, value):
+        norm = normalize_field(self.field, value)
+        if norm not in self.counts:
+            return
+        self.counts[norm] -= 1
+        if self.counts[norm] <= 0:
+            del self.counts[norm]
+            del self.display[norm]
+            for token in set(self._tokens(norm)):
+                key = token + KEY_SEP + norm
+                i = bisect.bisect_left(self.keys, key)
+                if i < len(self.keys) and self.keys[i] == key:
+                    del self.keys[i]
+        self._cache.clear()
+
+    def suggest(self, prefix, k=8):
+        # Up to k (value, count) pairs, most common first
+        needle = normalize_field(self.field, prefix)
+        if not needle:
+            return []
+        cache_key = (needle, k)
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+
+        lo = bisect.bisect_left(self.keys, needle)
+        hi = bisect.bisect_left(self.keys, needle + KEY_END, lo)
+        ranked = hi - lo <= SCAN_LIMIT
+
+        seen = {}
+        for i in range(lo, hi):
+            norm = self.keys[i].rsplit(KEY_SEP, 1)[1]
+            seen[norm] = self.counts[norm]
+            if not ranked and len(seen) >= k:
+                break
+        if ranked:
+            best = heapq.nlargest(k, seen.items(), key=lambda kv: (kv[1], -len(kv[0])))
+        else:
+            best = list(seen.items())
+        result = [(self.display[norm], count) for norm, count in best]
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[cache_key] = result
+        return result
+
+
+class Autocomplete:
+    # One FieldSuggester per search field, kept current by the PhoneBookDB change hook
+
+    def __init__(self):
+        self.fields = {field: FieldSuggester(field) for field in SEARCH_FIELDS}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, db):
+        # Build from one GROUP BY per field at startup; it walks the *_norm
+        # index in order, so SQLite needs no temp B-tree
+        auto = cls()
+        conn = db._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            for field, suggester in auto.fields.items():
+                col = NORM_COLUMNS[field]
+                suggester.add_many(cur.execute(
+                    f"SELECT {col}, MIN({field}), COUNT(*) FROM contacts GROUP BY {col}"
+                ))
+        finally:
+            conn.close()
+        return auto
+
+    def apply(self, changes):
+        # PhoneBookDB change hook
+        with self._lock:
+            for old, new in changes:
+                for field, suggester in self.fields.items():
+                    if old is not None and new is not None and old[field] == new[field]:
+                        continue
+                    if old is not None:
+                        suggester.remove(old[field])
+                    if new is not None:
+                        suggester.add(new[field])
+
+    def suggest(self, field, prefix, k=8):
+        suggester = self.fields.get(field)
+        if not suggester:
+            return []
+        with self._lock:
+            return suggester.suggest(prefix, k)
@@ -0,0 +1,239 @@
+# backup.py - Rotated online backups of the database and the photo store
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from database import PhoneBookDB, BACKUP_PAGES, BACKUP_PAUSE
+from photo_store import PhotoStore, PHOTOS_DIR
+
+BACKUP_DIR = os.environ.get("PHONEBOOK_BACKUP_DIR", "backups")
+BACKUP_PREFIX = "phonebook-"
+BACKUP_KEEP = 7
+BACKUP_INTERVAL = 24 * 3600
+DB_FILE = "phonebook.db"
+BACKUP_PHOTOS = "photos"
+MANIFEST = "manifest.json"
+
+
+class BackupManager:
+    # Each backup is a directory <directory>/phonebook-<UTC time>/ with
+    # phonebook.db (online copy, see PhoneBookDB.backup), photos/ holding every
+    # stored photo that copy references, and manifest.json. Photos are
+    # content-addressed and never rewritten (see photo_store.py), so one that
+    # is already in the previous backup is hard-linked instead of copied.
+    # A backup is built under a dot name and renamed when complete.
+
+    def __init__(self, db, directory=BACKUP_DIR, photos_dir=PHOTOS_DIR, keep=BACKUP_KEEP):
+        self.db = db
+        self.directory = directory
+        self.photos_dir = photos_dir
+        self.keep = keep
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def backups(self):
+        # Completed backups, oldest first
+        names = [
+            name for name in os.listdir(self.directory)
+            if name.startswith(BACKUP_PREFIX) and os.path.exists(os.path.join(self.directory, name, MANIFEST))
+        ]
+        return sorted(names)
+
+    def manifest(self, name):
+        with open(os.path.join(self.directory, name, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+
+    def run(self, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+        # Take one backup and rotate old ones; returns its manifest
+        with self._lock:
+            start = time.perf_counter()
+            name = BACKUP_PREFIX + time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+            if os.path.exists(os.path.join(self.directory, name)):
+                name += "-" + uuid.uuid4().hex[:6]
+            previous = self.backups()
+            previous = os.path.join(self.directory, previous[-1]) if previous else None
+            work = os.path.join(self.directory, "." + name)
+            os.makedirs(work)
+            try:
+                db_path = os.path.join(work, DB_FILE)
+                db_seconds, db_bytes = self.db.backup(db_path, pages=pages, pause=pause)
+                photos = self._copy_photos(db_path, work, previous)
+                manifest = {
+                    "name": name,
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "db_bytes": db_bytes,
+                    "db_seconds": round(db_seconds, 3),
+                    **photos,
+                    "seconds": round(time.perf_counter() - start, 3),
+                }
+                with open(os.path.join(work, MANIFEST), "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2)
+                os.rename(work, os.path.join(self.directory, name))
+            except BaseException:
+                shutil.rmtree(work, ignore_errors=True)
+                raise
+            manifest["removed"] = self.rotate()
+            return manifest
+
+    def _copy_photos(self, db_path, work, previous):
+        # Photos referenced by the backed-up database, not the live one, so
+        # the two halves of a backup always match: store entries in use plus
+        # every contacts.photo_path (older uuid-named photos aren't in the store).
+        # Paths outside photos_dir are counted, not copied.
+        conn = sqlite3.connect(db_path)
+        try:
+            paths = [r[0] for r in conn.execute(
+                "SELECT path FROM photos WHERE refcount > 0 "
+                "UNION SELECT photo_path FROM contacts WHERE photo_path IS NOT NULL AND photo_path != ''"
+            )]
+        finally:
+            conn.close()
+
+        copied = linked = missing = outside = size = 0
+        root = os.path.abspath(self.photos_dir)
+        for path in paths:
+            rel = os.path.relpath(os.path.abspath(path), root)
+            if rel.startswith(".."):
+                outside += 1
+                continue
+            dest = os.path.join(work, BACKUP_PHOTOS, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            old = os.path.join(previous, BACKUP_PHOTOS, rel) if previous else None
+            try:
+                if old and os.path.exists(old):
+                    try:
+                        os.link(old, dest)
+                        linked += 1
+                    except OSError:
+                        # No hard links on this filesystem
+                        shutil.copyfile(old, dest)
+                        copied += 1
+                else:
+                    shutil.copyfile(path, dest)
+                    copied += 1
+            except FileNotFoundError:
+                missing += 1
+                continue
+            size += os.path.getsize(dest)
+        return {"photos": copied + linked, "photos_copied": copied, "photos_linked": linked,
+                "photos_missing": missing, "photos_outside": outside, "photo_bytes": size}
+
+    def rotate(self):
+        # Remove all but the newest `keep` backups; returns the removed names
+        names = self.backups()
+        removed = names[:-self.keep] if self.keep > 0 else []
+        for name in removed:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        # Leftovers of interrupted runs
+        for name in os.listdir(self.directory):
+            if name.startswith("." + BACKUP_PREFIX):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        return removed
+
+    def restore(self, name=None):
+        # Restore a backup (the newest by default): the database through the
+        # backup API, then any of its photos missing from the photo directory.
+        # Stop the app first. Returns (name, photos restored).
+        names = self.backups()
+        if name is None:
+            if not names:
+                raise FileNotFoundError("no backups")
+            name = names[-1]
+        elif name not in names:
+            raise FileNotFoundError(f"no such backup: {name}")
+        source = os.path.join(self.directory, name)
+        self.db.restore(os.path.join(source, DB_FILE))
+
+        restored = 0
+        photos = os.path.join(source, BACKUP_PHOTOS)
+        for folder, _, files in os.walk(photos):
+            for file_name in files:
+                rel = os.path.relpath(os.path.join(folder, file_name), photos)
+                dest = os.path.join(self.photos_dir, rel)
+                if os.path.exists(dest):
+                    continue
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = os.path.join(os.path.dirname(dest), f".{uuid.uuid4().hex}.tmp")
+                shutil.copyfile(os.path.join(folder, file_name), tmp)
+                os.replace(tmp, dest)
+                restored += 1
+        store = PhotoStore(self.db, self.photos_dir)
+        if store.owner() is None:
+            store.claim()
+        return name, restored
+
+
+def describe(manifest):
+    # One-line report of a backup
+    skipped = "".join(f", {manifest[key]} {label}" for key, label in
+                      (("photos_missing", "missing"), ("photos_outside", "outside the photo directory"))
+                      if manifest.get(key))
+    return (f"{manifest['name']}: database {manifest['db_bytes'] / 1e6:.1f} MB in {manifest['db_seconds']:.2f} s, "
+            f"{manifest['photos']} photos ({manifest['photos_copied']} copied, {manifest['photos_linked']} linked, "
+            f"{manifest['photo_bytes'] / 1e6:.1f} MB{skipped}), total {manifest['seconds']:.2f} s")
+
+
+class BackupScheduler(threading.Thread):
+    # Runs manager.run() every `interval` seconds on a daemon thread
+    # (the first run after one interval); failures are reported, not raised
+
+    def __init__(self, manager, interval=BACKUP_INTERVAL):
+        super().__init__(name="backup", daemon=True)
+        self.manager = manager
+        self.interval = interval
+        self.last = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.last = self.manager.run()
+                print(f"Backup {describe(self.last)}")
+            except Exception as e:
+                print(f"Backup failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backups of the phonebook database and photos")
+    parser.add_argument("command", choices=["run", "list", "restore", "schedule"])
+    parser.add_argument("name", nargs="?", help="backup to restore (default: newest)")
+    parser.add_argument("--db", default="phonebook.db")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="backup directory")
+    parser.add_argument("--photos", default=PHOTOS_DIR, help="photo store directory")
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="backups to keep")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES, help="pages copied per step")
+    parser.add_argument("--pause", type=float, default=BACKUP_PAUSE, help="seconds between steps")
+    parser.add_argument("--interval", type=float, default=BACKUP_INTERVAL, help="seconds between scheduled backups")
+    args = parser.parse_args()
+
+    manager = BackupManager(PhoneBookDB(args.db), args.dir, args.photos, args.keep)
+    if args.command == "run":
+        manifest = manager.run(args.pages, args.pause)
+        print(describe(manifest))
+        for name in manifest["removed"]:
+            print(f"  removed {name}")
+    elif args.command == "list":
+        for name in manager.backups():
+            print(describe(manager.manifest(name)))
+    elif args.command == "restore":
+        name, photos = manager.restore(args.name)
+        print(f"Restored {name} ({photos} photos copied back)")
+    else:
+        scheduler = BackupScheduler(manager, args.interval)
+        scheduler.start()
+        try:
+            scheduler.join()
+        except KeyboardInterrupt:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench_startup.py - Cold start of the app: process start to first frame and to data
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIRST_FRAME = "first-frame"
+DATA_FRAME = "data-frame"
+
+
+def child(db_path):
+    # Runs in the measured process: build the app on a HeadlessPage and
+    # report the first update and the first update that shows contacts
+    import threading
+    import flet as ft
+    from headless import HeadlessPage
+    from main import PhoneBookApp
+
+    state = {"app": None, "data": threading.Event()}
+
+    def on_update(page):
+        if page.updates == 1:
+            print(FIRST_FRAME, flush=True)
+        app = state["app"]
+        if app is None or state["data"].is_set():
+            return
+        rows = app.contacts_container.controls
+        if len(rows) > 1 and not isinstance(getattr(rows[1], "content", None), ft.ProgressRing):
+            print(DATA_FRAME, flush=True)
+            state["data"].set()
+
+    page = HeadlessPage(on_update=on_update)
+    # Scratch photo directory and no housekeeping: the copied database must
+    # not sweep or back up the real photo store
+    state["app"] = PhoneBookApp(page, db_name=db_path, housekeeping=False,
+                                photos_dir=os.path.join(os.path.dirname(db_path), "photos"))
+    state["data"].wait(timeout=120)
+    os._exit(0)
+
+
+def run_once(db_path, workdir):
+    # Wall time (ms) from spawning the interpreter to each marker line
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_DIR, "bench_startup.py"), "--child", db_path],
+        cwd=workdir, stdout=subprocess.PIPE, text=True,
+        env=dict(os.environ, PYTHONPATH=PROJECT_DIR),
+    )
+    marks = {}
+    for line in proc.stdout:
+        marks[line.strip()] = (time.perf_counter() - start) * 1000
+    proc.wait()
+    return marks.get(FIRST_FRAME), marks.get(DATA_FRAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app cold start")
+    parser.add_argument("--child", metavar="DB", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, default=0, help="synthetic contacts (0: copy of phonebook.db)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        if args.rows:
+            from bench_replica import fill
+            from database import PhoneBookDB
+            fill(PhoneBookDB(db_path), args.rows)
+        else:
+            import shutil
+            shutil.copyfile(os.path.join(PROJECT_DIR, "phonebook.db"), db_path)
+
+        # One untimed run warms the OS file cache and writes .pyc files
+        run_once(db_path, tmp)
+        first, data = [], []
+        for _ in range(args.repeat):
+            f, d = run_once(db_path, tmp)
+            if f is None or d is None:
+                sys.exit("child did not report both frames")
+            first.append(f)
+            data.append(d)
+
+        print(f"first frame: median {statistics.median(first):.0f} ms (min {min(first):.0f})")
+        print(f"data frame:  median {statistics.median(data):.0f} ms (min {min(data):.0f})")
+
+
+if __name__ == "__main__":
+    main()
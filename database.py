@@ -1,25 +1,338 @@
 # database.py - PhoneBook Database
 import sqlite3
-import csv
 import os
+import threading
+import time
+import uuid
+
+from normalize import normalize_field
+
+CONTACT_FIELDS = ['first_name', 'last_name', 'group_name', 'position', 'email', 'phone', 'photo_path']
+REQUIRED_FIELDS = ['first_name', 'last_name', 'group_name', 'phone']
+UPDATE_FIELDS = CONTACT_FIELDS
+SORT_FIELDS = ['id'] + CONTACT_FIELDS[:-1]
+CONTACT_COLUMNS = ['id'] + CONTACT_FIELDS
+SELECT_COLUMNS = ", ".join(CONTACT_COLUMNS)
+
+# Searchable fields and the column holding their normalized form (normalize.py)
+SEARCH_FIELDS = ['first_name', 'last_name', 'group_name', 'position', 'email', 'phone']
+NORM_COLUMNS = {field: f"{field}_norm" for field in SEARCH_FIELDS}
+MATCH_MODES = ['contains', 'prefix', 'exact']
+FACET_FIELDS = ['group_name', 'position']
+PREFIX_END = '\U0010ffff'
+
+# Schema migrations, applied in order by PhoneBookDB._migrate. PRAGMA
+# user_version stores how many have run, so an up-to-date database costs one
+# PRAGMA read at startup. Steps must be idempotent: databases created before
+# versioning start at 0 and already have some of these objects.
+MIGRATIONS = [
+    '_create_contacts',
+    '_add_norm_columns',
+    '_create_norm_indexes',
+    '_create_facet_counts',
+    '_create_photo_refs',
+    '_add_dedup_key',
+    '_create_sort_indexes',
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+# Rows per transaction when a migration backfills a column
+BACKFILL_CHUNK = 5000
+
+# Duplicate detection: contacts.dedup_key holds the normalized values of the
+# configured key fields and carries a unique index. The key in use is stored in
+# the settings table (see set_dedup_key); rows with an empty key part are
+# never treated as duplicates.
+DEDUP_KEYS = {
+    'phone': ['phone'],
+    'phone_name': ['phone', 'first_name', 'last_name'],
+    'email': ['email'],
+}
+DEFAULT_DEDUP_KEY = 'phone'
+DEDUP_SEP = '\x1f'
+DUPLICATE_MODES = ['skip', 'update']
+DUPLICATE_MESSAGE = "این مخاطب قبلاً ثبت شده است"
+# merge_contacts(): fields filled from the merged-away contact when empty
+MERGE_FIELDS = ['position', 'email', 'photo_path']
+MERGE_BATCH = 200
+
+# Online backup: pages copied per backup step, and the pause between steps
+# that lets other connections in. A backup that keeps restarting because the
+# database changes under it falls back to a single-step copy.
+BACKUP_PAGES = 100
+BACKUP_PAUSE = 0.005
+BACKUP_RESTARTS = 3
+
+# db_name for a database that lives only in memory (see PhoneBookDB.__init__)
+MEMORY_DB = ':memory:'
+# Directory for relative database names (and their -wal/-shm files);
+# the project directory when unset
+DATA_DIR_ENV = 'PHONEBOOK_DATA_DIR'
+
+INSERT_SQL = '''
+    INSERT INTO contacts 
+    (first_name, last_name, group_name, position, email, phone, photo_path,
+     first_name_norm, last_name_norm, group_name_norm, position_norm, email_norm, phone_norm,
+     dedup_key)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# Upsert on the dedup key; an imported row without a photo keeps the current one
+UPSERT_SQL = INSERT_SQL + '''
+    ON CONFLICT (dedup_key) DO UPDATE SET
+''' + ",\n".join(
+    f"        {col} = excluded.{col}"
+    for col in CONTACT_FIELDS[:-1] + [NORM_COLUMNS[f] for f in SEARCH_FIELDS]
+) + ''',
+        photo_path = CASE WHEN excluded.photo_path != '' THEN excluded.photo_path ELSE photo_path END
+'''
+
+
+class ContactRecord(tuple):
+    # Compact read-only contact row: a plain tuple plus a shared column index.
+    # Supports the dict-style access the UI uses (record["id"], record.get("phone")).
+    __slots__ = ()
+    
+    COLUMNS = CONTACT_COLUMNS
+    _INDEX = {name: i for i, name in enumerate(CONTACT_COLUMNS)}
+    
+    @classmethod
+    def from_row(cls, cursor, row):
+        # sqlite3 row_factory
+        return tuple.__new__(cls, row)
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._INDEX[key])
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        i = self._INDEX.get(key)
+        return default if i is None else tuple.__getitem__(self, i)
+    
+    def keys(self):
+        return list(self.COLUMNS)
+    
+    def to_dict(self):
+        return dict(zip(self.COLUMNS, self))
+    
+    def __repr__(self):
+        return f"ContactRecord({self.to_dict()!r})"
+
+
+def as_dict(contact):
+    # Plain dict for either result type (JSON output etc.)
+    return contact.to_dict() if isinstance(contact, ContactRecord) else dict(contact)
+
 
 class PhoneBookDB:
-    def __init__(self, db_name="phonebook.db"):
-        project_dir = os.path.dirname(os.path.abspath(__file__))
-        self.db_name = os.path.join(project_dir, db_name)
-        self._init_db()
+    def __init__(self, db_name="phonebook.db", compact=False, replica=False, lazy=False):
+        # compact=True returns ContactRecord tuples instead of one dict per row
+        # replica=True serves search() from an in-memory columnar copy (see replica.py)
+        # lazy=True defers opening the file and creating the schema to the first query
+        # db_name is a file in the data directory (PHONEBOOK_DATA_DIR, else the
+        # project directory), an absolute path (used as is, e.g. on tmpfs) or MEMORY_DB
+        self.memory = db_name == MEMORY_DB
+        self._anchor = None
+        if self.memory:
+            # A named memdb database is shared by every connection in this
+            # process that opens the name, with normal locking (busy timeouts
+            # apply, unlike cache=shared); the anchor connection keeps it alive
+            self.db_name = f"file:/phonebook-{uuid.uuid4().hex}?vfs=memdb"
+            self._anchor = sqlite3.connect(self.db_name, uri=True, check_same_thread=False)
+        elif os.path.isabs(db_name):
+            self.db_name = db_name
+        else:
+            data_dir = os.environ.get(DATA_DIR_ENV) or os.path.dirname(os.path.abspath(__file__))
+            os.makedirs(data_dir, exist_ok=True)
+            self.db_name = os.path.join(data_dir, db_name)
+        self.compact = compact
+        self._listeners = []
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        self._dedup_fields = None
+        if not lazy:
+            self._ensure_ready()
+        self.replica = None
+        if replica:
+            self.load_replica()
+    
+    def load_replica(self):
+        # Build the in-memory replica and serve search() from it from then on
+        # (until then search() runs on SQL). Writes committed during the load
+        # are queued and replayed onto it; replaying one the load already saw
+        # is harmless, since the replica applies changes by contact id.
+        from replica import ContactReplica
+        lock = threading.Lock()
+        queued = []
+        target = None
+        
+        def apply(changes):
+            with lock:
+                if target is None:
+                    queued.append(changes)
+                else:
+                    target.apply(changes)
+        
+        self.add_listener(apply)
+        replica = ContactReplica.load(self)
+        with lock:
+            for changes in queued:
+                replica.apply(changes)
+            target = replica
+        self.replica = replica
+        return replica
     
     def _get_conn(self):
-        # Connect to DB
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
+        # Connect to DB (wait on locks instead of failing right away)
+        if not self._ready:
+            self._ensure_ready()
+        return self._connect()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=10, uri=self.memory)
+        conn.row_factory = ContactRecord.from_row if self.compact else sqlite3.Row
         return conn
     
+    def close(self):
+        # Release an in-memory database (file databases need no closing)
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+    
+    def _ensure_ready(self):
+        # Create/upgrade the schema once, on whichever thread gets here first
+        with self._ready_lock:
+            if not self._ready:
+                self._init_db()
+                self._ready = True
+    
+    def _convert(self, row):
+        # Result object for one row
+        return row if self.compact else dict(row)
+    
+    def _collect(self, cursor):
+        # Result list for a cursor, without an intermediate fetchall() list
+        if self.compact:
+            return list(cursor)
+        return [dict(row) for row in cursor]
+    
+    # ---- change hook ----
+    
+    def add_listener(self, listener):
+        # listener(changes) is called after every committed write, where
+        # changes is a list of (old, new) ContactRecords: old is None for
+        # inserts and new is None for deletes. Only writes made through this
+        # PhoneBookDB instance are reported.
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _begin_write(self, conn):
+        # Take the write lock up front so before/after snapshots are consistent
+        if self._listeners:
+            conn.execute("BEGIN IMMEDIATE")
+    
+    def _fetch_records(self, conn, ids):
+        # {id: ContactRecord} for the given ids (empty when nobody listens)
+        if not self._listeners or not ids:
+            return {}
+        cur = conn.cursor()
+        cur.row_factory = ContactRecord.from_row
+        records = {}
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            for rec in cur.execute(f"SELECT {SELECT_COLUMNS} FROM contacts WHERE id IN ({placeholders})", chunk):
+                records[rec[0]] = rec
+        return records
+    
+    def _changes(self, conn, ids, old):
+        # (old, new) pairs for rows touched by an insert/update
+        if not self._listeners:
+            return []
+        new = self._fetch_records(conn, ids)
+        return [(old.get(i), new[i]) for i in dict.fromkeys(ids) if i in new]
+    
+    def _notify(self, changes):
+        if not changes:
+            return
+        for listener in list(self._listeners):
+            listener(changes)
+    
     def _init_db(self):
-        # Create contacts table
-        conn = self._get_conn()
-        c = conn.cursor()
-        c.execute('''
+        # Bring the schema up to SCHEMA_VERSION
+        conn = self._connect()
+        conn.row_factory = None
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                # New files give freed pages back a few at a time (see maintenance.py);
+                # on an existing file this only takes effect after a full VACUUM
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                # WAL lets readers (UI, API threads) run while a write is in progress
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._migrate(conn, version)
+            # Read now: writes need it while holding the write lock, and a
+            # second connection can't read an in-memory database then
+            self._dedup_fields = self._read_dedup_fields(conn)
+        finally:
+            conn.close()
+        print(f"DB ready: {MEMORY_DB if self.memory else self.db_name}")
+    
+    def _migrate(self, conn, version):
+        # Run each pending step in its own write transaction, then any chunked
+        # backfill it registered, and only then record the new version. A crash
+        # part way re-runs the (idempotent) step and resumes the backfill.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_backfill (
+                name TEXT PRIMARY KEY,
+                sql TEXT NOT NULL,
+                last_id INTEGER NOT NULL,
+                end_id INTEGER NOT NULL
+            )
+        ''')
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            step = getattr(self, MIGRATIONS[target - 1])
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                step(conn)
+            self._run_backfills(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+    
+    def _schedule_backfill(self, conn, name, sql):
+        # Register an UPDATE to run over all current rows in id chunks.
+        # sql must take (low id exclusive, high id inclusive) parameters.
+        end_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM contacts").fetchone()[0]
+        conn.execute(
+            "INSERT OR IGNORE INTO schema_backfill (name, sql, last_id, end_id) VALUES (?, ?, 0, ?)",
+            (name, sql, end_id)
+        )
+    
+    def _run_backfills(self, conn):
+        # Work through registered backfills, BACKFILL_CHUNK rows per transaction,
+        # so other writers only ever wait for one chunk
+        conn.create_function("normalize_field", 2, normalize_field, deterministic=True)
+        for (name,) in conn.execute("SELECT name FROM schema_backfill").fetchall():
+            while True:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    row = conn.execute(
+                        "SELECT sql, last_id, end_id FROM schema_backfill WHERE name = ?", (name,)
+                    ).fetchone()
+                    if row is None:
+                        break
+                    sql, last_id, end_id = row
+                    if last_id >= end_id:
+                        conn.execute("DELETE FROM schema_backfill WHERE name = ?", (name,))
+                        break
+                    high = min(last_id + BACKFILL_CHUNK, end_id)
+                    conn.execute(sql, (last_id, high))
+                    conn.execute("UPDATE schema_backfill SET last_id = ? WHERE name = ?", (high, name))
+    
+    def _create_contacts(self, conn):
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS contacts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 first_name TEXT NOT NULL,
@@ -31,85 +344,421 @@ class PhoneBookDB:
                 photo_path TEXT
             )
         ''')
-        conn.commit()
-        conn.close()
-        print(f"DB ready: {self.db_name}")
+    
+    def _add_norm_columns(self, conn):
+        # Add the normalized search columns; existing rows are filled by a chunked backfill
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(contacts)")}
+        missing = [field for field in SEARCH_FIELDS if NORM_COLUMNS[field] not in existing]
+        for field in missing:
+            conn.execute(f"ALTER TABLE contacts ADD COLUMN {NORM_COLUMNS[field]} TEXT NOT NULL DEFAULT ''")
+        if missing:
+            sets = ", ".join(f"{NORM_COLUMNS[f]} = normalize_field('{f}', {f})" for f in missing)
+            self._schedule_backfill(conn, 'norm_columns', f"UPDATE contacts SET {sets} WHERE id > ? AND id <= ?")
+    
+    def _create_norm_indexes(self, conn):
+        # Built after the backfill so it doesn't churn the index
+        for field in SEARCH_FIELDS:
+            col = NORM_COLUMNS[field]
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_contacts_{col} ON contacts ({col})")
+    
+    def _create_facet_counts(self, conn):
+        # Per-value counts for FACET_FIELDS, kept current by triggers so
+        # facets() never needs a GROUP BY over contacts
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'facet_counts'"
+        ).fetchone()
+        if exists:
+            return
+        conn.execute('''
+            CREATE TABLE facet_counts (
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (field, value)
+            ) WITHOUT ROWID
+        ''')
+        for field in FACET_FIELDS:
+            inc = f'''
+                INSERT INTO facet_counts (field, value, count)
+                SELECT '{field}', NEW.{field}, 1 WHERE COALESCE(NEW.{field}, '') != ''
+                ON CONFLICT (field, value) DO UPDATE SET count = count + 1;'''
+            dec = f'''
+                UPDATE facet_counts SET count = count - 1 WHERE field = '{field}' AND value = OLD.{field};
+                DELETE FROM facet_counts WHERE field = '{field}' AND value = OLD.{field} AND count <= 0;'''
+            conn.execute(f"CREATE TRIGGER facet_{field}_insert AFTER INSERT ON contacts BEGIN {inc} END")
+            conn.execute(f"CREATE TRIGGER facet_{field}_delete AFTER DELETE ON contacts BEGIN {dec} END")
+            conn.execute(f'''
+                CREATE TRIGGER facet_{field}_update AFTER UPDATE OF {field} ON contacts
+                WHEN OLD.{field} IS NOT NEW.{field}
+                BEGIN {dec} {inc} END
+            ''')
+            # One-time backfill for databases that predate the table
+            conn.execute(f'''
+                INSERT INTO facet_counts (field, value, count)
+                SELECT '{field}', {field}, COUNT(*) FROM contacts
+                WHERE COALESCE({field}, '') != '' GROUP BY {field}
+            ''')
+    
+    def _create_photo_refs(self, conn):
+        # Reference counts for photos in the content-addressed store (photo_store.py).
+        # Triggers keep refcount in step with contacts.photo_path; paths that are
+        # not in the store (older uuid files) simply match no row.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS photos (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_unreferenced ON photos (created) WHERE refcount <= 0")
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS photos_ref_insert AFTER INSERT ON contacts
+            WHEN COALESCE(NEW.photo_path, '') != ''
+            BEGIN UPDATE photos SET refcount = refcount + 1 WHERE path = NEW.photo_path; END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS photos_ref_delete AFTER DELETE ON contacts
+            WHEN COALESCE(OLD.photo_path, '') != ''
+            BEGIN UPDATE photos SET refcount = refcount - 1 WHERE path = OLD.photo_path; END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS photos_ref_update AFTER UPDATE OF photo_path ON contacts
+            WHEN OLD.photo_path IS NOT NEW.photo_path
+            BEGIN
+                UPDATE photos SET refcount = refcount - 1 WHERE path = OLD.photo_path;
+                UPDATE photos SET refcount = refcount + 1 WHERE path = NEW.photo_path;
+            END
+        ''')
+    
+    def _add_dedup_key(self, conn):
+        # Unique dedup_key column. Existing rows are keyed by a chunked
+        # UPDATE OR IGNORE in id order: the oldest row of a duplicate group
+        # gets the key, later ones keep NULL (left for the duplicate review).
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO settings (name, value) VALUES ('dedup_key', ?)", (DEFAULT_DEDUP_KEY,))
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(contacts)")}
+        if 'dedup_key' not in existing:
+            conn.execute("ALTER TABLE contacts ADD COLUMN dedup_key TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_dedup_key ON contacts (dedup_key)")
+        self._schedule_dedup_backfill(conn)
+    
+    def _schedule_dedup_backfill(self, conn):
+        fields = self._read_dedup_fields(conn)
+        expr = self._dedup_sql([NORM_COLUMNS[f] for f in fields])
+        self._schedule_backfill(
+            conn, 'dedup_key',
+            f"UPDATE OR IGNORE contacts SET dedup_key = {expr} WHERE id > ? AND id <= ?"
+        )
+    
+    def _create_sort_indexes(self, conn):
+        # One index per sortable column, so listing/paging in any order reads
+        # the index instead of sorting the table (rowid breaks ties: "ORDER BY
+        # col, id" is index order too). Checked by query_plans.py.
+        for field in SORT_FIELDS:
+            if field != 'id':
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_contacts_sort_{field} ON contacts ({field})")
+    
+    def _read_dedup_fields(self, conn):
+        row = conn.execute("SELECT value FROM settings WHERE name = 'dedup_key'").fetchone()
+        return DEDUP_KEYS.get(row[0] if row else DEFAULT_DEDUP_KEY, DEDUP_KEYS[DEFAULT_DEDUP_KEY])
+    
+    @property
+    def dedup_fields(self):
+        # Fields of the configured duplicate key (read once per instance)
+        if self._dedup_fields is None:
+            conn = self._get_conn()
+            try:
+                self._dedup_fields = self._read_dedup_fields(conn)
+            finally:
+                conn.close()
+        return self._dedup_fields
+    
+    def set_dedup_key(self, name):
+        # Switch the duplicate key (one of DEDUP_KEYS) and re-key all rows
+        if name not in DEDUP_KEYS:
+            return False, f"Unknown key: {name}"
+        conn = self._get_conn()
+        conn.row_factory = None
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("UPDATE settings SET value = ? WHERE name = 'dedup_key'", (name,))
+                conn.execute("UPDATE contacts SET dedup_key = NULL")
+                conn.execute("DELETE FROM schema_backfill WHERE name = 'dedup_key'")
+                self._schedule_dedup_backfill(conn)
+            self._run_backfills(conn)
+            self._dedup_fields = DEDUP_KEYS[name]
+            return True, "Updated"
+        except Exception as e:
+            return False, f"Error: {e}"
+        finally:
+            conn.close()
+    
+    def _dedup_sql(self, operands):
+        # SQL for the dedup key from one operand per key field (a column or "?")
+        present = " AND ".join(f"{op} != ''" for op in operands)
+        joined = f" || char({ord(DEDUP_SEP)}) || ".join(operands)
+        return f"CASE WHEN {present} THEN {joined} END"
+    
+    def _dedup_value(self, norms):
+        # Python twin of _dedup_sql for a {field: normalized value} dict
+        parts = [norms.get(field, '') for field in self.dedup_fields]
+        return DEDUP_SEP.join(parts) if all(parts) else None
     
     def add_contact(self, data):
         # Add new contact
-        required = ['first_name', 'last_name', 'group_name', 'phone']
-        for field in required:
-            if not data.get(field):
-                return False, f"Missing: {field}"
+        missing = self._missing_required(data)
+        if missing:
+            return False, f"Missing: {missing}"
         
         conn = self._get_conn()
         c = conn.cursor()
         try:
-            c.execute('''
-                INSERT INTO contacts 
-                (first_name, last_name, group_name, position, email, phone, photo_path)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('first_name', ''),
-                data.get('last_name', ''),
-                data.get('group_name', ''),
-                data.get('position', ''),
-                data.get('email', ''),
-                data.get('phone', ''),
-                data.get('photo_path', '')
-            ))
+            self._begin_write(conn)
+            c.execute(INSERT_SQL, self._insert_values(data))
+            changes = self._changes(conn, [c.lastrowid], {})
             conn.commit()
+            self._notify(changes)
             return True, f"Added (ID: {c.lastrowid})"
+        except sqlite3.IntegrityError:
+            return False, DUPLICATE_MESSAGE
         except Exception as e:
             return False, f"Error: {e}"
         finally:
             conn.close()
     
+    def _missing_required(self, data):
+        # First required field that is empty, or None
+        for field in REQUIRED_FIELDS:
+            if not data.get(field):
+                return field
+        return None
+    
+    def _insert_values(self, data):
+        # Column values for INSERT_SQL
+        values = [data.get(field, '') or '' for field in CONTACT_FIELDS]
+        norms = {field: normalize_field(field, data.get(field)) for field in SEARCH_FIELDS}
+        values += [norms[field] for field in SEARCH_FIELDS]
+        values.append(self._dedup_value(norms))
+        return tuple(values)
+    
+    def _set_clause(self, updates, rekey=True):
+        # "col = ?" parts and values for an UPDATE, keeping *_norm columns and
+        # the dedup key in sync (a clash with another row raises IntegrityError);
+        # rekey=False leaves dedup_key as it is
+        set_parts = []
+        values = []
+        norms = {}
+        for field, value in updates.items():
+            if field in UPDATE_FIELDS:
+                set_parts.append(f"{field} = ?")
+                values.append(value)
+                if field in NORM_COLUMNS:
+                    norms[field] = normalize_field(field, value)
+                    set_parts.append(f"{NORM_COLUMNS[field]} = ?")
+                    values.append(norms[field])
+        key_fields = self.dedup_fields if norms and rekey else []
+        if any(field in norms for field in key_fields):
+            # SET sees the old row, so changed key parts are bound as parameters
+            operands = ["?" if field in norms else NORM_COLUMNS[field] for field in key_fields]
+            set_parts.append(f"dedup_key = {self._dedup_sql(operands)}")
+            bound = [norms[field] for field in key_fields if field in norms]
+            values += bound + bound
+        return set_parts, values
+    
+    def add_many(self, contacts):
+        # Add several contacts in one transaction, skipping duplicates
+        # Returns (added_count, errors) where errors is a list of (index, message);
+        # each duplicate is reported with DUPLICATE_MESSAGE
+        added, duplicates, errors = self.import_many(contacts, 'skip')
+        errors += [(i, DUPLICATE_MESSAGE) for i in duplicates]
+        errors.sort(key=lambda e: -1 if e[0] is None else e[0])
+        return added, errors
+    
+    def import_many(self, contacts, on_duplicate='skip'):
+        # Bulk insert in one transaction. Rows whose dedup key already exists
+        # (in the table or earlier in the batch) are skipped, or with
+        # on_duplicate='update' overwrite the existing contact.
+        # Duplicates are found with one IN query per 500 keys, not per row.
+        # Returns (added_count, duplicate_indexes, errors)
+        if on_duplicate not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown duplicate mode: {on_duplicate}")
+        errors = []
+        rows = []
+        for i, data in enumerate(contacts):
+            if not isinstance(data, dict):
+                errors.append((i, "Not an object"))
+                continue
+            missing = self._missing_required(data)
+            if missing:
+                errors.append((i, f"Missing: {missing}"))
+            else:
+                rows.append((i, self._insert_values(data)))
+        
+        if not rows:
+            return 0, [], errors
+        
+        conn = self._get_conn()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                keys = [values[-1] for _, values in rows if values[-1] is not None]
+                existing = self._existing_keys(conn, keys)
+                
+                inserts = []
+                upserts = []
+                duplicates = []
+                seen = set()
+                for i, values in rows:
+                    key = values[-1]
+                    if key is not None and (key in existing or key in seen):
+                        duplicates.append(i)
+                        if on_duplicate == 'update':
+                            upserts.append(values)
+                        continue
+                    if key is not None:
+                        seen.add(key)
+                    inserts.append(values)
+                
+                if self._listeners:
+                    before_max = conn.execute("SELECT COALESCE(MAX(id), 0) FROM contacts").fetchone()[0]
+                    updated_ids = self._ids_for_keys(conn, [values[-1] for values in upserts])
+                    old = self._fetch_records(conn, updated_ids)
+                conn.executemany(INSERT_SQL, inserts)
+                conn.executemany(UPSERT_SQL, upserts)
+                if self._listeners:
+                    new_ids = [r[0] for r in conn.execute("SELECT id FROM contacts WHERE id > ?", (before_max,))]
+                    changes = self._changes(conn, updated_ids + new_ids, old)
+            if self._listeners:
+                self._notify(changes)
+            return len(inserts), duplicates, errors
+        except Exception as e:
+            return 0, [], errors + [(None, f"Error: {e}")]
+        finally:
+            conn.close()
+    
+    def _existing_keys(self, conn, keys):
+        # The subset of dedup keys already in the table
+        found = set()
+        cur = conn.cursor()
+        cur.row_factory = None
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            found.update(r[0] for r in cur.execute(
+                f"SELECT dedup_key FROM contacts WHERE dedup_key IN ({placeholders})", chunk))
+        return found
+    
+    def _ids_for_keys(self, conn, keys):
+        cur = conn.cursor()
+        cur.row_factory = None
+        ids = []
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            ids += [r[0] for r in cur.execute(
+                f"SELECT id FROM contacts WHERE dedup_key IN ({placeholders})", chunk)]
+        return ids
+    
     def get_all(self, sort_by='last_name'):
         # Get all contacts
+        if sort_by not in SORT_FIELDS:
+            sort_by = 'last_name'
         conn = self._get_conn()
         c = conn.cursor()
-        c.execute(f"SELECT * FROM contacts ORDER BY {sort_by}")
-        result = [dict(row) for row in c.fetchall()]
+        c.execute(f"SELECT {SELECT_COLUMNS} FROM contacts ORDER BY {sort_by}")
+        result = self._collect(c)
         conn.close()
         return result
     
-    def search(self, filters):
-        # Search contacts
+    def search(self, filters, limit=None, offset=0, match='contains', facets=None):
+        # Search contacts on normalized text (see normalize.py)
+        # match: 'contains' (substring), 'prefix' or 'exact'; prefix/exact use the *_norm indexes
+        # facets: {FACET_FIELDS column: value} matched on the stored value as-is,
+        # i.e. the same rows facet_counts counts for it
+        if self.replica and not facets and self.replica.can_serve(filters, match):
+            return self.replica.search(filters, limit, offset, compact=self.compact, match=match)
+        
+        query, params = self._search_query(filters, match, facets)
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        
         conn = self._get_conn()
         c = conn.cursor()
+        c.execute(query, params)
+        result = self._collect(c)
+        conn.close()
+        return result
+    
+    def iter_search(self, filters=None, match='contains', facets=None):
+        # Yield matching contacts one by one straight from the cursor
+        query, params = self._search_query(filters or {}, match, facets)
+        conn = self._get_conn()
+        try:
+            for row in conn.execute(query, params):
+                yield self._convert(row)
+        finally:
+            conn.close()
+    
+    def _search_query(self, filters, match='contains', facets=None):
+        # Build the search SQL and its parameters
+        where, params = self._filter_clause(filters, match, facets)
+        query = f"SELECT {SELECT_COLUMNS} FROM contacts WHERE {where} ORDER BY last_name, id"
+        return query, params
+    
+    def _filter_clause(self, filters, match='contains', facets=None):
+        # WHERE condition and parameters for the search filters ("1=1" when empty)
+        if match not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {match}")
         
-        query = "SELECT * FROM contacts WHERE 1=1"
+        query = "1=1"
         params = []
         
-        fields = {
-            'first_name': 'first_name',
-            'last_name': 'last_name',
-            'group_name': 'group_name',
-            'position': 'position',
-            'email': 'email',
-            'phone': 'phone'
-        }
+        for key in FACET_FIELDS:
+            if facets and facets.get(key) is not None:
+                query += f" AND {key} = ?"
+                params.append(facets[key])
         
-        for key, col in fields.items():
-            if key in filters and filters[key]:
-                query += f" AND {col} LIKE ?"
-                params.append(f"%{filters[key]}%")
+        for key, col in NORM_COLUMNS.items():
+            if not filters.get(key):
+                continue
+            needle = normalize_field(key, filters[key])
+            if not needle:
+                continue
+            if match == 'exact':
+                query += f" AND {col} = ?"
+                params.append(needle)
+            elif match == 'prefix':
+                # Range on the index instead of LIKE 'x%' (which can't use it case-sensitively)
+                query += f" AND {col} >= ? AND {col} < ?"
+                params += [needle, needle + PREFIX_END]
+            else:
+                query += f" AND instr({col}, ?) > 0"
+                params.append(needle)
         
-        query += " ORDER BY last_name"
-        c.execute(query, params)
-        result = [dict(row) for row in c.fetchall()]
-        conn.close()
-        return result
+        return query, params
     
     def delete(self, contact_id):
         # Delete contact by ID
         conn = self._get_conn()
-        c = conn.cursor()
-        c.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
-        conn.commit()
-        deleted = c.rowcount > 0
-        conn.close()
+        try:
+            with conn:
+                self._begin_write(conn)
+                old = self._fetch_records(conn, [contact_id])
+                deleted = conn.execute("DELETE FROM contacts WHERE id = ?", (contact_id,)).rowcount > 0
+        finally:
+            conn.close()
+        self._notify([(rec, None) for rec in old.values()])
         return deleted, "Deleted" if deleted else "Not found"
     
     def update(self, contact_id, updates):
@@ -117,34 +766,354 @@ class PhoneBookDB:
         if not updates:
             return False, "No updates"
         
+        set_parts, values = self._set_clause(updates)
+        
+        if not set_parts:
+            return False, "No valid fields"
+        
+        conn = self._get_conn()
+        try:
+            try:
+                return self._update_row(conn, contact_id, set_parts, values)
+            except sqlite3.IntegrityError:
+                conn.rollback()
+                if not self._unkeyed_duplicate(conn, contact_id, updates):
+                    return False, DUPLICATE_MESSAGE
+            # A duplicate the dedup_key migration left unkeyed stays editable
+            # (and unkeyed) as long as it remains that same duplicate
+            set_parts, values = self._set_clause(updates, rekey=False)
+            return self._update_row(conn, contact_id, set_parts, values)
+        except sqlite3.IntegrityError:
+            return False, DUPLICATE_MESSAGE
+        except Exception as e:
+            return False, f"Error: {e}"
+        finally:
+            conn.close()
+    
+    def _update_row(self, conn, contact_id, set_parts, values):
+        c = conn.cursor()
+        self._begin_write(conn)
+        old = self._fetch_records(conn, [contact_id])
+        c.execute(f"UPDATE contacts SET {', '.join(set_parts)} WHERE id = ?", values + [contact_id])
+        changes = self._changes(conn, [contact_id], old)
+        conn.commit()
+        self._notify(changes)
+        updated = c.rowcount > 0
+        return updated, "Updated" if updated else "Not found"
+    
+    def _unkeyed_duplicate(self, conn, contact_id, updates):
+        # True if the row has no dedup_key and updates keep its key unchanged
+        fields = self.dedup_fields
+        cur = conn.cursor()
+        cur.row_factory = None
+        row = cur.execute(
+            f"SELECT dedup_key, {', '.join(NORM_COLUMNS[f] for f in fields)} FROM contacts WHERE id = ?",
+            (contact_id,)
+        ).fetchone()
+        if row is None or row[0] is not None:
+            return False
+        old = dict(zip(fields, row[1:]))
+        new = dict(old, **{f: normalize_field(f, updates[f]) for f in fields if f in updates})
+        key = self._dedup_value(new)
+        return key is not None and key == self._dedup_value(old)
+
+    
+    def get_page(self, sort_by='last_name', limit=100, offset=0):
+        # Get one page of contacts plus the total count
+        if sort_by not in SORT_FIELDS:
+            sort_by = 'last_name'
         conn = self._get_conn()
         c = conn.cursor()
+        total = c.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+        c.execute(
+            f"SELECT {SELECT_COLUMNS} FROM contacts ORDER BY {sort_by}, id LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+        result = self._collect(c)
+        conn.close()
+        return result, total
+    
+    def get_by_id(self, contact_id):
+        # Get one contact by ID, or None
+        conn = self._get_conn()
+        row = conn.execute(f"SELECT {SELECT_COLUMNS} FROM contacts WHERE id = ?", (contact_id,)).fetchone()
+        conn.close()
+        return self._convert(row) if row else None
+    
+    def facets(self, field='group_name'):
+        # [(value, count)] for a FACET_FIELDS column, most common first
+        if field not in FACET_FIELDS:
+            return []
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(
+            "SELECT value, count FROM facet_counts WHERE field = ? ORDER BY count DESC, value",
+            (field,)
+        )
+        result = cur.fetchall()
+        conn.close()
+        return result
+    
+    def get_by_phone(self, phone):
+        # Get contacts with this phone number, in any of its accepted spellings
+        conn = self._get_conn()
+        c = conn.cursor()
+        c.execute(f"SELECT {SELECT_COLUMNS} FROM contacts WHERE phone_norm = ? ORDER BY id",
+                  (normalize_field('phone', phone),))
+        result = self._collect(c)
+        conn.close()
+        return result
+    
+    def update_contacts(self, items):
+        # Update several contacts in one transaction
+        # items: list of dicts, each with 'id' plus the fields to change
+        # Returns (updated_count, errors) where errors is a list of (index, message)
+        errors = []
+        statements = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append((i, "Not an object"))
+                continue
+            contact_id = item.get('id')
+            set_parts, values = self._set_clause(item)
+            if contact_id is None or not set_parts:
+                errors.append((i, "No valid fields" if contact_id is not None else "Missing: id"))
+                continue
+            statements.append((i, f"UPDATE contacts SET {', '.join(set_parts)} WHERE id = ?", values + [contact_id]))
         
-        valid = ['first_name', 'last_name', 'group_name', 'position', 'email', 'phone', 'photo_path']
-        set_parts = []
-        values = []
-        
-        for field, value in updates.items():
-            if field in valid:
-                set_parts.append(f"{field} = ?")
-                values.append(value)
+        if not statements:
+            return 0, errors
         
+        conn = self._get_conn()
+        updated = 0
+        try:
+            with conn:
+                self._begin_write(conn)
+                ids = [values[-1] for _, _, values in statements]
+                old = self._fetch_records(conn, ids)
+                for i, query, values in statements:
+                    try:
+                        count = conn.execute(query, values).rowcount
+                    except sqlite3.IntegrityError:
+                        errors.append((i, DUPLICATE_MESSAGE))
+                        continue
+                    if count > 0:
+                        updated += 1
+                    else:
+                        errors.append((i, "Not found"))
+                changes = self._changes(conn, ids, old)
+            self._notify(changes)
+            return updated, errors
+        except Exception as e:
+            return 0, errors + [(None, f"Error: {e}")]
+        finally:
+            conn.close()
+    
+    def _bulk_target(self, ids, filters, match):
+        # WHERE condition and parameters for a bulk update/delete: an id list
+        # or search filters. None when neither selects anything, so an empty
+        # filter never touches the whole table.
+        if ids is not None:
+            ids = [int(i) for i in ids]
+            if not ids:
+                return None
+            placeholders = ", ".join("?" for _ in ids)
+            return f"id IN ({placeholders})", ids
+        where, params = self._filter_clause(filters or {}, match)
+        if not params:
+            return None
+        return where, params
+    
+    def _target_ids(self, conn, where, params):
+        # Ids matched by a bulk condition (only needed when someone listens)
+        if not self._listeners:
+            return []
+        cur = conn.cursor()
+        cur.row_factory = None
+        return [r[0] for r in cur.execute(f"SELECT id FROM contacts WHERE {where}", params)]
+    
+    def update_many(self, updates, ids=None, filters=None, match='contains'):
+        # Apply the same changes to many contacts with one UPDATE statement,
+        # selected by an id list or by search filters (see search()).
+        # All or nothing: a change that would make two contacts share a
+        # dedup key rolls the whole statement back.
+        # Returns (updated_count, message)
+        set_parts, values = self._set_clause(updates or {})
         if not set_parts:
-            return False, "No valid fields"
-        
-        values.append(contact_id)
-        query = f"UPDATE contacts SET {', '.join(set_parts)} WHERE id = ?"
+            return 0, "No valid fields"
+        target = self._bulk_target(ids, filters, match)
+        if target is None:
+            return 0, "Nothing selected"
+        where, params = target
         
+        conn = self._get_conn()
         try:
-            c.execute(query, values)
-            conn.commit()
-            updated = c.rowcount > 0
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                affected = self._target_ids(conn, where, params)
+                old = self._fetch_records(conn, affected)
+                updated = conn.execute(
+                    f"UPDATE contacts SET {', '.join(set_parts)} WHERE {where}", values + params
+                ).rowcount
+                changes = self._changes(conn, affected, old)
+            self._notify(changes)
             return updated, "Updated" if updated else "Not found"
+        except sqlite3.IntegrityError:
+            return 0, DUPLICATE_MESSAGE
         except Exception as e:
-            return False, f"Error: {e}"
+            return 0, f"Error: {e}"
+        finally:
+            conn.close()
+    
+    def delete_many(self, ids=None, filters=None, match='contains'):
+        # Delete several contacts in one statement, by id list or by search filters
+        target = self._bulk_target(ids, filters, match)
+        if target is None:
+            return 0
+        where, params = target
+        conn = self._get_conn()
+        try:
+            with conn:
+                self._begin_write(conn)
+                old = self._fetch_records(conn, self._target_ids(conn, where, params))
+                deleted = conn.execute(f"DELETE FROM contacts WHERE {where}", params).rowcount
+            self._notify([(rec, None) for rec in old.values()])
+            return deleted
+        finally:
+            conn.close()
+
+    
+    def merge_contacts(self, pairs, batch_size=MERGE_BATCH):
+        # Merge duplicates: each (keep_id, drop_id) pair copies drop's non-empty
+        # values into keep's empty optional fields, then deletes drop. Pairs are
+        # applied batch_size per transaction; a pair whose contact was already
+        # merged away follows the chain to the surviving contact.
+        # Returns (merged_count, errors) where errors is a list of (index, message)
+        errors = []
+        merged = 0
+        survivor = {}
+        
+        def resolve(contact_id):
+            while contact_id in survivor:
+                contact_id = survivor[contact_id]
+            return contact_id
+        
+        pairs = [(int(a), int(b)) for a, b in pairs]
+        key_expr = self._dedup_sql([NORM_COLUMNS[f] for f in self.dedup_fields])
+        conn = self._get_conn()
+        cur = conn.cursor()
+        cur.row_factory = ContactRecord.from_row
+        try:
+            for start in range(0, len(pairs), batch_size):
+                changes = []
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for i, (keep_id, drop_id) in enumerate(pairs[start:start + batch_size], start):
+                        keep_id, drop_id = resolve(keep_id), resolve(drop_id)
+                        if keep_id == drop_id:
+                            errors.append((i, "Already merged"))
+                            continue
+                        keep = cur.execute(f"SELECT {SELECT_COLUMNS} FROM contacts WHERE id = ?", (keep_id,)).fetchone()
+                        drop = cur.execute(f"SELECT {SELECT_COLUMNS} FROM contacts WHERE id = ?", (drop_id,)).fetchone()
+                        if keep is None or drop is None:
+                            errors.append((i, "Not found"))
+                            continue
+                        fill = {field: drop[field] for field in MERGE_FIELDS if not keep[field] and drop[field]}
+                        conn.execute("DELETE FROM contacts WHERE id = ?", (drop_id,))
+                        if fill:
+                            set_parts, values = self._set_clause(fill)
+                            conn.execute(f"UPDATE contacts SET {', '.join(set_parts)} WHERE id = ?", values + [keep_id])
+                        # A survivor that was itself an unkeyed duplicate can take the key now
+                        conn.execute(
+                            f"UPDATE OR IGNORE contacts SET dedup_key = {key_expr} WHERE id = ? AND dedup_key IS NULL",
+                            (keep_id,)
+                        )
+                        survivor[drop_id] = keep_id
+                        merged += 1
+                        if self._listeners:
+                            new = cur.execute(f"SELECT {SELECT_COLUMNS} FROM contacts WHERE id = ?", (keep_id,)).fetchone()
+                            changes += [(drop, None), (keep, new)]
+                self._notify(changes)
+            return merged, errors
+        except Exception as e:
+            return merged, errors + [(None, f"Error: {e}")]
         finally:
             conn.close()
 
+    
+    # ---- backup ----
+    
+    def backup(self, dest_path, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+        # Online copy of the database with the SQLite backup API. Each step
+        # copies `pages` pages under a short read lock and sleeps `pause`, so
+        # live reads and writes keep going. The copy is built next to
+        # dest_path, checked and renamed into place.
+        # Returns (seconds, size in bytes)
+        start = time.perf_counter()
+        tmp = dest_path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        state = {"remaining": None, "restarts": 0}
+        
+        def step(status, remaining, total):
+            # A write from another connection restarts the copy from page 1
+            if state["remaining"] is not None and remaining > state["remaining"]:
+                state["restarts"] += 1
+                if state["restarts"] > BACKUP_RESTARTS:
+                    raise InterruptedError("backup keeps restarting")
+            state["remaining"] = remaining
+            if remaining:
+                time.sleep(pause)
+        
+        src = self._get_conn()
+        dest = sqlite3.connect(tmp)
+        try:
+            try:
+                src.backup(dest, pages=pages, progress=step)
+            except InterruptedError:
+                # One step: a WAL read snapshot, writers are not blocked
+                src.backup(dest)
+            # Self-contained file: no -wal next to the copy
+            dest.execute("PRAGMA journal_mode=DELETE")
+            result = dest.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"backup check failed: {result}")
+        except BaseException:
+            dest.close()
+            os.remove(tmp)
+            raise
+        finally:
+            src.close()
+        dest.close()
+        os.replace(tmp, dest_path)
+        return time.perf_counter() - start, os.path.getsize(dest_path)
+    
+    def snapshot(self, dest_path):
+        # Save the whole database to a file in one step (e.g. an in-memory
+        # test database); restore() loads it back
+        return self.backup(dest_path, pages=-1)
+    
+    def restore(self, src_path):
+        # Replace the database contents with a backup copy, then bring its
+        # schema up to date. Other processes should be stopped first; a
+        # replica in this process is not reloaded.
+        if not os.path.exists(src_path):
+            raise FileNotFoundError(src_path)
+        src = sqlite3.connect(src_path)
+        dest = self._connect()
+        try:
+            src.backup(dest)
+            if not self.memory:
+                dest.execute("PRAGMA journal_mode=WAL")
+        finally:
+            src.close()
+            dest.close()
+        with self._ready_lock:
+            self._ready = False
+            self._dedup_fields = None
+        self._ensure_ready()
+
 
 # Helper to show all contacts
 def show_all(db, title):
@@ -167,14 +1136,8 @@ def show_all(db, title):
 def test_all():
     print("=== Testing all DB functions ===")
     
-    project_dir = os.path.dirname(os.path.abspath(__file__))
-    test_db_path = os.path.join(project_dir, "test.db")
-    
-    # Clean old test
-    if os.path.exists(test_db_path):
-        os.remove(test_db_path)
-    
-    db = PhoneBookDB("test.db")  
+    # In memory: nothing to clean up, no disk I/O
+    db = PhoneBookDB(MEMORY_DB)  
     
     # 1. Start with empty DB
     show_all(db, "1. EMPTY DATABASE (START)")
@@ -246,9 +1209,19 @@ def test_all():
     # 6. Final state
     show_all(db, "9. FINAL DATABASE STATE")
     
-    print(f"\n✓ Database files created in project folder: {project_dir}")
-    print(f"  - phonebook.db (main database)")
-    print(f"  - test.db (test database)")
+    # 7. Snapshot to disk and load it into a fresh in-memory database
+    print("\n\n10. SNAPSHOT / RESTORE")
+    print("-" * 70)
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot.db")
+        seconds, size = db.snapshot(path)
+        copy = PhoneBookDB(MEMORY_DB)
+        copy.restore(path)
+        same = [c['id'] for c in copy.get_all()] == [c['id'] for c in db.get_all()]
+        print(f"Snapshot {size} bytes in {seconds * 1000:.1f} ms, restored copy matches: {same}")
+        copy.close()
+    db.close()
 
 # Run test
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+# duplicates.py - Near-duplicate contact detection by blocking and scoring
+import argparse
+import difflib
+import re
+from collections import defaultdict
+
+from database import PhoneBookDB
+
+# Blocks bigger than this (very common names, placeholder phones) are skipped:
+# every pair in a block is compared, so one huge block would be quadratic
+MAX_BLOCK = 50
+PHONE_SUFFIX = 7
+THRESHOLD = 0.75
+# Letters dropped for the consonant skeleton: Latin vowels and the Persian
+# letters that double as vowels, so "Mohammadi"/"Mohamadi" and "محمدی"/"محمدي" meet
+_VOWELS = re.compile(r"[aeiouyاآوی]")
+_REPEATS = re.compile(r"(.)\1+")
+
+
+def _name_tokens(first, last):
+    # Sorted words of both name fields, so swapped first/last names match
+    return sorted((first + " " + last).split())
+
+
+def _skeleton(tokens):
+    return " ".join(_REPEATS.sub(r"\1", _VOWELS.sub("", token)) for token in tokens)
+
+
+def blocking_keys(first, last, phone):
+    # Keys that put likely duplicates in the same block
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) >= PHONE_SUFFIX:
+        yield "p:" + digits[-PHONE_SUFFIX:]
+    tokens = _name_tokens(first, last)
+    if tokens:
+        yield "n:" + " ".join(tokens)
+        skeleton = _skeleton(tokens)
+        if skeleton.strip():
+            yield "s:" + skeleton
+
+
+def score(a, b):
+    # Similarity in [0, 1] of two (first, last, phone, email) normalized tuples
+    first_a, last_a, phone_a, email_a = a
+    first_b, last_b, phone_b, email_b = b
+
+    if phone_a and phone_a == phone_b:
+        phone = 1.0
+    elif len(phone_a) >= PHONE_SUFFIX and phone_a[-PHONE_SUFFIX:] == phone_b[-PHONE_SUFFIX:]:
+        phone = 0.8
+    else:
+        phone = 0.0
+
+    name = difflib.SequenceMatcher(
+        None, " ".join(_name_tokens(first_a, last_a)), " ".join(_name_tokens(first_b, last_b))
+    ).ratio()
+
+    if email_a and email_b:
+        return 0.45 * phone + 0.4 * name + 0.15 * (email_a == email_b)
+    return 0.5 * phone + 0.5 * name
+
+
+def find_duplicates(db, threshold=THRESHOLD, max_block=MAX_BLOCK):
+    # Candidate pairs from shared blocking keys, scored; one pass over contacts.
+    # Returns [(score, older_id, newer_id)], best first.
+    rows = {}
+    blocks = defaultdict(list)
+    conn = db._get_conn()
+    try:
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(
+            "SELECT id, first_name_norm, last_name_norm, phone_norm, email_norm FROM contacts"
+        )
+        for contact_id, first, last, phone, email in cur:
+            rows[contact_id] = (first, last, phone, email)
+            for key in blocking_keys(first, last, phone):
+                blocks[key].append(contact_id)
+    finally:
+        conn.close()
+
+    candidates = set()
+    for ids in blocks.values():
+        if len(ids) < 2 or len(ids) > max_block:
+            continue
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                candidates.add((a, b) if a < b else (b, a))
+
+    scored = []
+    for a, b in candidates:
+        value = score(rows[a], rows[b])
+        if value >= threshold:
+            scored.append((round(value, 3), a, b))
+    scored.sort(key=lambda item: (-item[0], item[1], item[2]))
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find (and optionally merge) near-duplicate contacts")
+    parser.add_argument("--db", default="phonebook.db")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--merge", action="store_true", help="merge every pair found (keeps the older contact)")
+    args = parser.parse_args()
+
+    db = PhoneBookDB(args.db)
+    pairs = find_duplicates(db, args.threshold)
+    for value, a, b in pairs:
+        first, second = db.get_by_id(a), db.get_by_id(b)
+        print(f"{value:.2f}  #{a} {first['first_name']} {first['last_name']} {first['phone']}"
+              f"  <->  #{b} {second['first_name']} {second['last_name']} {second['phone']}")
+    print(f"{len(pairs)} candidate pairs")
+    if args.merge and pairs:
+        merged, errors = db.merge_contacts([(a, b) for _, a, b in pairs])
+        print(f"Merged {merged}, skipped {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
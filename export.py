@@ -0,0 +1,85 @@
+# export.py - Stream contacts to CSV or JSON Lines
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+
+from database import PhoneBookDB, as_dict
+
+# Same column layout the CSV importer accepts
+EXPORT_COLUMNS = ['first_name', 'last_name', 'group_name', 'position', 'email', 'phone']
+FORMATS = ['csv', 'jsonl']
+CHUNK_ROWS = 500
+
+
+def iter_export(db, fmt='csv', filters=None, facets=None):
+    # Yield the export as UTF-8 byte chunks, CHUNK_ROWS rows at a time
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        buffer.write('\ufeff')  # BOM so Excel opens Persian text correctly
+        writer.writerow(EXPORT_COLUMNS)
+
+    pending = 0
+    for row in db.iter_search(filters, facets=facets):
+        if writer:
+            writer.writerow([row.get(col) or '' for col in EXPORT_COLUMNS])
+        else:
+            buffer.write(json.dumps(as_dict(row), ensure_ascii=False) + '\n')
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+
+def export_contacts(db, out, fmt='csv', filters=None, facets=None):
+    # Write the export to a binary file object; returns bytes written
+    written = 0
+    for chunk in iter_export(db, fmt, filters, facets):
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def export_to_file(db, path, fmt=None, filters=None, facets=None):
+    # Export to a path, picking the format from the extension if not given
+    if fmt is None:
+        fmt = 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+    with open(path, 'wb') as f:
+        return export_contacts(db, f, fmt, filters, facets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export PhoneBook contacts")
+    parser.add_argument("--db", default="phonebook.db")
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="defaults to the --out extension, or csv")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    for field in EXPORT_COLUMNS:
+        parser.add_argument(f"--{field}", help=f"filter on {field}")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        db = PhoneBookDB(args.db)
+    filters = {field: getattr(args, field) for field in EXPORT_COLUMNS if getattr(args, field)}
+
+    if args.out:
+        written = export_to_file(db, args.out, args.format, filters)
+        print(f"Exported {written} bytes to {args.out}", file=sys.stderr)
+    else:
+        export_contacts(db, sys.stdout.buffer, args.format or 'csv', filters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# headless.py - Run PhoneBookApp without a Flet client (benchmarks, load tests)
+
+
+class HeadlessPage:
+    # Minimal stand-in for ft.Page: keeps the control tree in memory and
+    # counts updates instead of sending them to a client.
+    # on_update(page) is called after every update().
+
+    def __init__(self, on_update=None, width=1300):
+        self.controls = []
+        self.overlay = []
+        self.width = width
+        self.snack_bar = None
+        self.updates = 0
+        self.on_update = on_update
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+        self.update()
+
+    def update(self, *controls):
+        self.updates += 1
+        if self.on_update:
+            self.on_update(self)
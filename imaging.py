@@ -0,0 +1,124 @@
+# imaging.py - Background decode/resize/re-encode of uploaded photos
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it photos are stored as uploaded
+    Image = None
+
+MAX_SIDE = 1280       # stored photo: longest side in pixels
+THUMB_SIDE = 120      # row/preview thumbnail
+JPEG_QUALITY = 85
+
+
+class ProcessedPhoto:
+    # Result of one pipeline job: a bounded-size file ready for PhotoStore.put()
+    # and the small thumbnail bytes for previews and the packed store
+    __slots__ = ("source", "path", "thumbnail")
+
+    def __init__(self, source, path, thumbnail):
+        self.source = source
+        self.path = path
+        self.thumbnail = thumbnail
+
+    def discard(self):
+        # Remove the temporary processed file
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _encode(image, fmt, fp):
+    if fmt == "JPEG":
+        image.save(fp, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    else:
+        image.save(fp, "PNG", optimize=True)
+
+
+def _has_alpha(image):
+    # True for images with real transparency, including palette images that carry it
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def process_image(src_path, work_dir):
+    # Decode, orient, downsize and re-encode one image into work_dir
+    if Image is None:
+        ext = os.path.splitext(src_path)[1].lower()
+        dest = os.path.join(work_dir, f"{uuid.uuid4().hex}{ext}")
+        shutil.copyfile(src_path, dest)
+        with open(dest, "rb") as f:
+            return ProcessedPhoto(src_path, dest, f.read())
+
+    with Image.open(src_path) as image:
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft("RGB", (MAX_SIDE, MAX_SIDE))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = _has_alpha(image)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+
+        fmt = "PNG" if has_alpha else "JPEG"
+        ext = ".png" if has_alpha else ".jpg"
+        dest = os.path.join(work_dir, f"{uuid.uuid4().hex}{ext}")
+        with open(dest, "wb") as f:
+            _encode(image, fmt, f)
+
+        thumb = image.copy()
+        thumb.thumbnail((THUMB_SIDE, THUMB_SIDE), Image.LANCZOS)
+        buffer = io.BytesIO()
+        _encode(thumb, fmt, buffer)
+        return ProcessedPhoto(src_path, dest, buffer.getvalue())
+
+
+def make_thumbnail(src_path):
+    # Thumbnail bytes only (for packed_store.migrate_directory)
+    if Image is None:
+        with open(src_path, "rb") as f:
+            return f.read()
+    with Image.open(src_path) as image:
+        image.draft("RGB", (THUMB_SIDE * 2, THUMB_SIDE * 2))
+        image = ImageOps.exif_transpose(image)
+        fmt = "PNG" if _has_alpha(image) else "JPEG"
+        image = image.convert("RGBA" if fmt == "PNG" else "RGB")
+        image.thumbnail((THUMB_SIDE, THUMB_SIDE), Image.LANCZOS)
+        buffer = io.BytesIO()
+        _encode(image, fmt, buffer)
+        return buffer.getvalue()
+
+
+class ImagePipeline:
+    # Bounded thread pool for photo processing. Pillow releases the GIL while
+    # decoding and resizing, so threads are enough and results stay in-process.
+
+    def __init__(self, workers=None, work_dir=None):
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="phonebook-img-")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="image",
+        )
+
+    def submit(self, src_path, on_done=None):
+        # Queue an image; on_done(future) runs on the worker thread when finished
+        future = self.executor.submit(process_image, src_path, self.work_dir)
+        if on_done:
+            future.add_done_callback(on_done)
+        return future
+
+    def map(self, src_paths):
+        # Process many images; yields (src_path, ProcessedPhoto or Exception) as they finish
+        futures = {self.executor.submit(process_image, path, self.work_dir): path for path in src_paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,216 @@
+# loadtest.py - Concurrent sessions against PhoneBookDB (or the headless app) with an operation mix
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from database import PhoneBookDB
+from bench_replica import fill, FIRST_NAMES, LAST_NAMES, GROUPS, POSITIONS
+
+OPERATIONS = ['search', 'page', 'add', 'edit', 'delete', 'import']
+DEFAULT_MIX = "search=60,page=15,add=10,edit=10,delete=3,import=2"
+IMPORT_BATCH = 50
+MEMORY_SAMPLE_SECONDS = 0.5
+SEARCH_FIELDS = ['first_name', 'last_name', 'group_name', 'phone']
+
+
+def parse_mix(text):
+    # "search=60,add=10" -> {'search': 60, 'add': 10}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def rss_bytes():
+    # Resident set size of this process (Linux /proc; peak RSS elsewhere)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def is_lock_error(result):
+    # PhoneBookDB reports some failures as (False, "Error: database is locked")
+    text = str(result)
+    return "locked" in text or "busy" in text
+
+
+class Session:
+    # One simulated user: picks operations from the mix and records
+    # (operation, seconds, outcome) for each. With app=True the work goes
+    # through a PhoneBookApp on a HeadlessPage: searches fill the search
+    # fields and reload the table, writes are followed by a reload the
+    # way the dialogs do it. The app gets photos_dir (a scratch directory)
+    # and none of its housekeeping, so it never touches real photos or backups.
+
+    def __init__(self, number, db_path, mix, seed, app=False, photos_dir=None):
+        self.number = number
+        self.rnd = random.Random(seed + number)
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.results = []
+        self.own_ids = []
+        self.phones = 0
+        if app:
+            from headless import HeadlessPage
+            from main import PhoneBookApp
+            self.app = PhoneBookApp(HeadlessPage(), db_name=db_path, photos_dir=photos_dir, housekeeping=False)
+            self.db = self.app.db
+        else:
+            self.app = None
+            self.db = PhoneBookDB(db_path, compact=True)
+
+    def contact(self):
+        self.phones += 1
+        return {
+            'first_name': self.rnd.choice(FIRST_NAMES), 'last_name': self.rnd.choice(LAST_NAMES),
+            'group_name': self.rnd.choice(GROUPS), 'position': self.rnd.choice(POSITIONS),
+            'email': f"load{self.number}.{self.phones}@example.com",
+            # 094x is never used by fill(): 3 digits of session, 4 of counter
+            'phone': f"094{self.number % 10}{self.number % 1000:03d}{self.phones % 10000:04d}",
+        }
+
+    def random_id(self, max_id):
+        return self.rnd.randint(1, max(max_id, 1))
+
+    def refresh(self):
+        if self.app:
+            self.app.load_contacts()
+
+    def run_op(self, op, max_id):
+        # Returns the DB result (used to spot lock errors reported as messages)
+        if op == 'search':
+            field = self.rnd.choice(SEARCH_FIELDS)
+            value = {'first_name': FIRST_NAMES, 'last_name': LAST_NAMES, 'group_name': GROUPS}.get(field)
+            needle = self.rnd.choice(value) if value else f"09{self.rnd.randint(10, 39)}"
+            if self.app:
+                for key, control in self.app.search_fields.items():
+                    control.value = needle if key == field else ""
+                self.app.load_contacts()
+                return None
+            return len(self.db.search({field: needle}, limit=200))
+        if op == 'page':
+            return len(self.db.get_page('last_name', 100, self.rnd.randint(0, max_id))[0])
+        if op == 'add':
+            data = self.contact()
+            ok, message = self.db.add_contact(data)
+            if ok:
+                self.own_ids += [c['id'] for c in self.db.get_by_phone(data['phone'])]
+            self.refresh()
+            return (ok, message)
+        if op == 'edit':
+            result = self.db.update(self.random_id(max_id), {'position': self.rnd.choice(POSITIONS) or 'مدیر'})
+            self.refresh()
+            return result
+        if op == 'delete':
+            contact_id = self.own_ids.pop() if self.own_ids else self.random_id(max_id)
+            if self.app:
+                self.app.delete_contact(contact_id)
+                return None
+            return self.db.delete(contact_id)
+        if op == 'import':
+            added, _, errors = self.db.import_many([self.contact() for _ in range(IMPORT_BATCH)])
+            self.refresh()
+            return errors or added
+        raise ValueError(op)
+
+    def run(self, deadline, max_id):
+        while time.perf_counter() < deadline:
+            op = self.rnd.choices(self.ops, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                result = self.run_op(op, max_id)
+                outcome = 'lock' if is_lock_error(result) else 'ok'
+            except sqlite3.OperationalError as e:
+                outcome = 'lock' if is_lock_error(e) else 'error'
+            except Exception:
+                outcome = 'error'
+            self.results.append((op, time.perf_counter() - start, outcome))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(sessions, elapsed, memory):
+    results = [r for s in sessions for r in s.results]
+    print(f"\n{len(results)} operations in {elapsed:.1f} s: {len(results) / elapsed:.1f} ops/s")
+    print(f"{'operation':<8} | {'count':>6} | {'ops/s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | "
+          f"{'max ms':>7} | {'locks':>5} | {'errors':>6}")
+    print("-" * 84)
+    for op in OPERATIONS:
+        rows = [r for r in results if r[0] == op]
+        if not rows:
+            continue
+        ms = [seconds * 1000 for _, seconds, _ in rows]
+        locks = sum(1 for r in rows if r[2] == 'lock')
+        errors = sum(1 for r in rows if r[2] == 'error')
+        print(f"{op:<8} | {len(rows):>6} | {len(rows) / elapsed:>7.1f} | {statistics.median(ms):>7.1f} | "
+              f"{percentile(ms, 0.95):>7.1f} | {percentile(ms, 0.99):>7.1f} | {max(ms):>7.1f} | "
+              f"{locks:>5} | {errors:>6}")
+    start, peak, end = memory[0], max(memory), memory[-1]
+    print(f"\nmemory (RSS): start {start / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB, "
+          f"end {end / 1e6:.1f} MB, growth {(end - start) / 1e6:+.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test PhoneBookDB with concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions (threads)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic contacts to start with")
+    parser.add_argument("--db", help="existing database to use instead (it is modified)")
+    parser.add_argument("--app", action="store_true", help="drive a headless PhoneBookApp per session")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "load.db")
+        if not args.db:
+            fill(PhoneBookDB(db_path), args.rows)
+        _, max_id = PhoneBookDB(db_path).get_page('id', 0)
+
+        photos_dir = os.path.join(tmp, "photos")
+        sessions = [Session(i, db_path, mix, args.seed, args.app, photos_dir) for i in range(args.sessions)]
+        # Baseline after the sessions (and their apps) are set up
+        memory = [rss_bytes()]
+        print(f"{args.sessions} sessions, {max_id} contacts, mix {args.mix}{' (headless app)' if args.app else ''}")
+
+        done = threading.Event()
+
+        def sample_memory():
+            while not done.wait(MEMORY_SAMPLE_SECONDS):
+                memory.append(rss_bytes())
+
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        threads = [threading.Thread(target=s.run, args=(deadline, max_id), name=f"session-{s.number}")
+                   for s in sessions]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+        memory.append(rss_bytes())
+        report(sessions, elapsed, memory)
+
+
+if __name__ == "__main__":
+    main()
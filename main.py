@@ -1,21 +1,30 @@
 import flet as ft
-import csv
-from io import StringIO
 import os
 import base64
-import uuid
-import shutil
-import re
-from database import PhoneBookDB
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import PhoneBookDB, DUPLICATE_MESSAGE
+from photo_store import PhotoStore, PHOTOS_DIR
+from normalize import normalize_phone, validate_phone
+
+
+# Rows painted before the first page.update(); the rest follow in chunks
+FIRST_PAGE_ROWS = 50
+STREAM_CHUNK_ROWS = 200
+# Candidate pairs shown in the duplicate review dialog
+DUPLICATE_REVIEW_LIMIT = 200
 
 
 class ContactRow(ft.Container):
-    def __init__(self, contact, is_admin=False, on_edit=None, on_delete=None):
+    def __init__(self, contact, is_admin=False, on_edit=None, on_delete=None, on_select=None, selected=False):
         super().__init__()
         self.contact = contact
         self.is_admin = is_admin
         self.on_edit_callback = on_edit
         self.on_delete_callback = on_delete
+        self.on_select_callback = on_select
+        self.selected = selected
+        self.actions_cell = None
         self.build()
 
     def build(self):
@@ -32,7 +41,28 @@ class ContactRow(ft.Container):
             ft.Container(ft.Text(self.contact.get("phone", ""), size=12), width=100, padding=5),
         ]
 
+        self.content = ft.Row(cells, spacing=0)
         if self.is_admin:
+            self.set_admin(True)
+        self.padding = ft.padding.all(8)
+        self.bgcolor = ft.Colors.WHITE
+        self.border_radius = 5
+        self.border = ft.border.all(0.5, ft.Colors.GREY_300)
+        self.margin = ft.margin.only(bottom=5)
+
+    def set_admin(self, is_admin):
+        # Show or hide the select/edit/delete cell; it is only built the first
+        # time it is needed, and the caller sends the page update
+        self.is_admin = is_admin
+        if self.actions_cell is None:
+            if not is_admin:
+                return
+            self.select_box = ft.Checkbox(
+                value=self.selected,
+                on_change=lambda e, cid=self.contact["id"]: self.on_select_callback(cid, e.control.value) if self.on_select_callback else None,
+                tooltip="انتخاب",
+            )
+            
             edit_button = ft.IconButton(
                 icon=ft.Icons.EDIT,
                 icon_color="orange",
@@ -49,37 +79,20 @@ class ContactRow(ft.Container):
                 tooltip="حذف",
             )
             
-            actions = ft.Row([edit_button, delete_button], spacing=5)
-            cells.append(ft.Container(actions, width=100, padding=5))
+            actions = ft.Row([self.select_box, edit_button, delete_button], spacing=0)
+            self.actions_cell = ft.Container(actions, width=140, padding=5)
+            self.content.controls.append(self.actions_cell)
+        self.actions_cell.visible = is_admin
 
-        self.content = ft.Row(cells, spacing=0)
-        self.padding = ft.padding.all(8)
-        self.bgcolor = ft.Colors.WHITE
-        self.border_radius = 5
-        self.border = ft.border.all(0.5, ft.Colors.GREY_300)
-        self.margin = ft.margin.only(bottom=5)
+    def set_selected(self, selected):
+        # Tick or clear the selection box without firing on_select
+        self.selected = selected
+        if self.actions_cell is not None:
+            self.select_box.value = selected
 
     def create_photo_display(self):
-        # Display contact photo or default avatar
-        photo_path = self.contact.get("photo_path")
-        
-        if photo_path and os.path.exists(photo_path):
-            try:
-                with open(photo_path, 'rb') as f:
-                    image_bytes = f.read()
-                    base64_image = base64.b64encode(image_bytes).decode()
-                
-                return ft.Image(
-                    src_base64=base64_image,
-                    width=60,
-                    height=60,
-                    fit=ft.ImageFit.COVER,
-                    border_radius=30,
-                )
-            except:
-                pass
-        
-        return ft.Container(
+        # Default avatar; the photo itself is filled in later by set_photo()
+        self.photo_slot = ft.Container(
             content=ft.Icon(
                 name=ft.Icons.PERSON,
                 color=ft.Colors.GREY_400,
@@ -91,16 +104,57 @@ class ContactRow(ft.Container):
             bgcolor=ft.Colors.GREY_200,
             alignment=ft.alignment.center,
         )
+        return self.photo_slot
+
+    def set_photo(self, image_bytes):
+        # Swap the placeholder for the contact photo (called from a loader thread)
+        self.photo_slot.content = ft.Image(
+            src_base64=base64.b64encode(image_bytes).decode(),
+            width=60,
+            height=60,
+            fit=ft.ImageFit.COVER,
+            border_radius=30,
+        )
+        self.photo_slot.bgcolor = None
+        try:
+            self.photo_slot.update()
+        except Exception:
+            # Row was removed from the page before its photo arrived
+            pass
+
+
+DEFAULT_GROUPS = ["برق", "مکانیک", "کامپیوتر", "IT", "نرم‌افزار", "معماری", "شیمی"]
 
 
 class PhoneBookApp:
-    def __init__(self, page: ft.Page):
+    def __init__(self, page: ft.Page, db_name="phonebook.db", photos_dir=PHOTOS_DIR, housekeeping=True):
+        # photos_dir and housekeeping=False (no photo sweep, maintenance or
+        # backups) let harnesses run the app on a scratch database without
+        # touching the real photo store, backups or database files
         self.page = page
-        self.db = PhoneBookDB("phonebook.db")
+        self.housekeeping = housekeeping
+        # lazy: the schema check runs on the loader thread, after the first paint
+        # (and so does the replica, see start_background_work)
+        self.db = PhoneBookDB(db_name, compact=True, lazy=True)
         self.is_admin = False
+        self.table_header = None
+        
+        # Optional packed thumbnail store: one mmapped file instead of a file per row
+        self.thumbs = None
+        if os.environ.get("PHONEBOOK_PACKED_THUMBS") == "1":
+            from packed_store import PackedPhotoStore
+            self.thumbs = PackedPhotoStore()
+        
+        self.photos_dir = photos_dir
+        self.photo_store = PhotoStore(self.db, self.photos_dir, thumbs=self.thumbs)
         
-        self.photos_dir = "contact_photos"
-        os.makedirs(self.photos_dir, exist_ok=True)
+        # Row photos are read on a small pool so the list renders immediately
+        self.photo_loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="row-photo")
+        self.photo_loads = []
+        
+        # Uploaded photos are decoded, resized and re-encoded off the UI thread;
+        # the pool (and Pillow) is only loaded once a photo is picked
+        self._image_pipeline = None
         
         self.logo_path = "assets/111.png"
         
@@ -113,72 +167,96 @@ class PhoneBookApp:
             "phone": ft.TextField(label="تلفن", width=160, border_color=ft.Colors.ORANGE_400)
         }
         
-        for field in self.search_fields.values():
+        for key, field in self.search_fields.items():
             field.on_submit = self.handle_search_enter
+            field.on_change = lambda e, key=key: self.show_suggestions(key, e.control.value)
+        
+        # Prefix suggestions, filled in once the in-memory index is built
+        self.autocomplete = None
+        self.suggestions_row = ft.Row(wrap=True, spacing=8, visible=False)
+        
+        # Group filter chips with live counts from the facet_counts table;
+        # group_facet is the chip's group while the group field still shows it
+        self.facet_row = ft.Row(wrap=True, spacing=8)
+        self.group_facet = None
         
         self.contacts_container = ft.Column(spacing=0, scroll="auto")
         self.current_dialog = None
-        
+        # Photo picked in the open dialog and not saved yet (future of a ProcessedPhoto)
+        self.pending_photo = None
+        
+        self.list_generation = 0
+        # Held by load_contacts while it checks its generation and changes the
+        # list, so an older load never touches the list of a newer one
+        self.list_lock = threading.Lock()
+        # Rows ticked for bulk edit/delete, and the ids of the listed contacts
+        self.selected_ids = set()
+        self.listed_ids = []
+        
+        # First paint: header, search box and an empty table; data follows
         self.setup_page()
         self.build_ui()
+        self.contacts_container.controls.append(self.create_table_header())
+        self.contacts_container.controls.append(
+            ft.Container(ft.ProgressRing(width=24, height=24), padding=20, alignment=ft.alignment.center)
+        )
+        self.page.update()
+        threading.Thread(target=self.start_background_work, daemon=True).start()
+    
+    def start_background_work(self):
+        # Everything that can wait until the page is on screen
+        self.check_storage()
         self.load_contacts()
+        self.load_autocomplete()
+        # Optional in-memory search replica; searches use SQL until it is built
+        if os.environ.get("PHONEBOOK_REPLICA") == "1":
+            self.db.load_replica()
+        if not self.housekeeping:
+            return
+        # Opt-in: clear out photo files nothing references (old uploads,
+        # crashed saves) now and every PHONEBOOK_PHOTO_SWEEP_HOURS; sweep()
+        # refuses a photo directory of another database
+        if os.environ.get("PHONEBOOK_PHOTO_SWEEP") == "1":
+            from photo_store import SweepScheduler
+            self.sweeper = SweepScheduler(self.photo_store)
+            self.sweeper.start()
+        # Checkpoints, incremental vacuum and statistics while the app is idle
+        if os.environ.get("PHONEBOOK_MAINTENANCE", "1") == "1":
+            from maintenance import Maintenance, MaintenanceScheduler
+            self.maintenance = MaintenanceScheduler(Maintenance(self.db))
+            self.maintenance.start()
+        # Optional scheduled backups (see backup.py)
+        hours = os.environ.get("PHONEBOOK_BACKUP_HOURS")
+        if hours:
+            from backup import BackupManager, BackupScheduler
+            manager = BackupManager(self.db, photos_dir=self.photos_dir)
+            self.backups = BackupScheduler(manager, float(hours) * 3600)
+            self.backups.start()
+    
+    def check_storage(self):
+        # Warn when data would be written to the container's overlay layer
+        from storage import check_data_dirs
+        paths = {"photos (PHONEBOOK_PHOTOS_DIR)": self.photos_dir}
+        if not self.db.memory:
+            paths["database (PHONEBOOK_DATA_DIR)"] = self.db.db_name
+        if self.thumbs is not None:
+            paths["thumbnail cache (PHONEBOOK_CACHE_DIR)"] = self.thumbs.directory
+        check_data_dirs(paths)
+    
+    @property
+    def image_pipeline(self):
+        if self._image_pipeline is None:
+            from imaging import ImagePipeline
+            self._image_pipeline = ImagePipeline(work_dir=os.path.join(self.photos_dir, ".incoming"))
+        return self._image_pipeline
     
     def validate_phone(self, phone):
         # Validate Iranian phone numbers
-        if not phone or not str(phone).strip():
-            return False, "شماره تلفن نمی‌تواند خالی باشد"
-        
-        cleaned = re.sub(r'[^\d+]', '', str(phone))
-        
-        # Valid Iranian phone patterns
-        patterns = [
-            r'^\+98\d{10}$',      # +989121234567
-            r'^0098\d{10}$',      # 00989121234567
-            r'^98\d{10}$',        # 989121234567
-            r'^09\d{9}$',         # 09121234567
-            r'^9\d{9}$',          # 9121234567
-            r'^\d{10}$',          # 09121234567 یا 0211234567
-            r'^0\d{10}$',         # 02112345678
-            r'^0\d{2,9}$',        # Other landlines
-        ]
-        
-        for pattern in patterns:
-            if re.match(pattern, cleaned):
-                return True, self.format_phone(cleaned)
-        
-        return False, "شماره تلفن نامعتبر است. فرمت‌های قابل قبول: 09123456789 یا 02187654321"
+        return validate_phone(phone)
     
     def format_phone(self, phone):
         # Standardize phone format
-        cleaned = re.sub(r'[^\d+]', '', str(phone))
-        
-        # Convert +98 to 0
-        if cleaned.startswith('+98'):
-            if cleaned.startswith('+989'):
-                return f"0{cleaned[3:]}"
-            return cleaned[1:]
-        
-        # Convert 0098 to 0
-        if cleaned.startswith('0098'):
-            if cleaned.startswith('00989'):
-                return f"0{cleaned[4:]}"
-            return cleaned[2:]
-        
-        # Convert 98 to 0
-        if cleaned.startswith('98'):
-            if cleaned.startswith('989'):
-                return f"0{cleaned[2:]}"
-            return cleaned
-        
-        # Add leading 0 to mobile numbers
-        if cleaned.startswith('9') and len(cleaned) == 10:
-            return f"0{cleaned}"
-        
-        # Add leading 0 to 10-digit numbers
-        if not cleaned.startswith('0') and len(cleaned) == 10:
-            return f"0{cleaned}"
-        
-        return cleaned
+        return normalize_phone(phone)
     
     def show_validation_error(self, message):
         # Show error snackbar
@@ -208,6 +286,33 @@ class PhoneBookApp:
     
     def handle_search_enter(self, e):
         # Load contacts on Enter key
+        self.suggestions_row.visible = False
+        self.load_contacts()
+    
+    def load_autocomplete(self):
+        # Build the suggestion index off the UI thread, then keep it updated on writes
+        from autocomplete import Autocomplete
+        autocomplete = Autocomplete.load(self.db)
+        self.db.add_listener(autocomplete.apply)
+        self.autocomplete = autocomplete
+    
+    def show_suggestions(self, key, value):
+        # Show top suggestions for the field being typed in
+        suggestions = self.autocomplete.suggest(key, value) if self.autocomplete and value else []
+        self.suggestions_row.controls = [
+            ft.TextButton(
+                f"{text} ({count})",
+                on_click=lambda e, text=text: self.apply_suggestion(key, text),
+            )
+            for text, count in suggestions
+        ]
+        self.suggestions_row.visible = bool(suggestions)
+        self.suggestions_row.update()
+    
+    def apply_suggestion(self, key, text):
+        # Fill the field with the chosen suggestion and search
+        self.search_fields[key].value = text
+        self.suggestions_row.visible = False
         self.load_contacts()
 
     def setup_page(self):
@@ -224,6 +329,9 @@ class PhoneBookApp:
     def build_header(self):
         # Build header with logo and role toggle
         logo_widget = self.get_logo_widget()
+        self.role_icon = ft.Icon(name=ft.Icons.PERSON, color=ft.Colors.ORANGE_700)
+        self.role_label = ft.Text("", size=12, color=ft.Colors.ORANGE_800)
+        self.show_role()
         
         return ft.Container(
             padding=20,
@@ -241,17 +349,7 @@ class PhoneBookApp:
                         spacing=15,
                         controls=[
                             ft.Container(
-                                content=ft.Row([
-                                    ft.Icon(
-                                        name=ft.Icons.ADMIN_PANEL_SETTINGS if self.is_admin else ft.Icons.PERSON,
-                                        color=ft.Colors.ORANGE_700,
-                                    ),
-                                    ft.Text(
-                                        "مدیر سیستم" if self.is_admin else "کاربر عادی",
-                                        size=12,
-                                        color=ft.Colors.ORANGE_800
-                                    ),
-                                ]),
+                                content=ft.Row([self.role_icon, self.role_label]),
                                 padding=10,
                                 border_radius=10,
                                 bgcolor=ft.Colors.ORANGE_100,
@@ -356,15 +454,14 @@ class PhoneBookApp:
                         wrap=False,
                         spacing=15,
                     ),
+                    self.suggestions_row,
+                    self.facet_row,
                 ]
             ),
         )
 
     def build_admin_actions(self):
-        # Show admin buttons if admin mode
-        if not self.is_admin:
-            return ft.Container()
-        
+        # Admin buttons; built once and hidden in user mode
         add_button = ft.ElevatedButton(
             "افزودن مخاطب",
             icon=ft.Icons.PERSON_ADD,
@@ -383,28 +480,170 @@ class PhoneBookApp:
             style=ft.ButtonStyle(padding=15),
         )
         
-        return ft.Container(
+        export_picker = ft.FilePicker(on_result=self.handle_export_result)
+        self.page.overlay.append(export_picker)
+        
+        export_button = ft.ElevatedButton(
+            "خروجی CSV / JSONL",
+            icon=ft.Icons.DOWNLOAD,
+            bgcolor=ft.Colors.GREEN_400,
+            color=ft.Colors.WHITE,
+            on_click=lambda e: export_picker.save_file(
+                file_name="contacts.csv",
+                allowed_extensions=["csv", "jsonl"],
+            ),
+            style=ft.ButtonStyle(padding=15),
+        )
+        
+        duplicates_button = ft.ElevatedButton(
+            "بررسی تکراری‌ها",
+            icon=ft.Icons.MERGE_TYPE,
+            bgcolor=ft.Colors.BLUE_GREY_400,
+            color=ft.Colors.WHITE,
+            on_click=self.show_duplicates_dialog,
+            style=ft.ButtonStyle(padding=15),
+        )
+        
+        self.admin_actions = ft.Container(
             bgcolor=ft.Colors.WHITE,
             padding=15,
             border_radius=12,
             border=ft.border.all(1, ft.Colors.GREY_300),
-            content=ft.Row(
-                spacing=15,
+            visible=self.is_admin,
+            content=ft.Column(
+                spacing=10,
                 controls=[
-                    add_button,
-                    add_csv_button,
+                    ft.Row(
+                        spacing=15,
+                        controls=[
+                            add_button,
+                            add_csv_button,
+                            export_button,
+                            duplicates_button,
+                        ],
+                    ),
+                    self.build_bulk_bar(),
                 ],
             ),
         )
+        return self.admin_actions
+    
+    def build_bulk_bar(self):
+        # Actions on the ticked rows: one DB statement and one reload each
+        self.selection_label = ft.Text("", size=13, color=ft.Colors.GREY_700)
+        self.bulk_group = ft.Dropdown(
+            label="انتقال به گروه",
+            width=180,
+            options=[ft.dropdown.Option(g) for g in DEFAULT_GROUPS],
+            border_color=ft.Colors.ORANGE_400,
+        )
+        self.bulk_position = ft.TextField(label="سمت اجرایی جدید", width=180, border_color=ft.Colors.ORANGE_400)
+        self.bulk_controls = [
+            ft.ElevatedButton("اعمال تغییرات", icon=ft.Icons.EDIT_NOTE, on_click=self.bulk_update),
+            ft.ElevatedButton(
+                "حذف انتخاب‌شده‌ها",
+                icon=ft.Icons.DELETE_SWEEP,
+                bgcolor=ft.Colors.RED_400,
+                color=ft.Colors.WHITE,
+                on_click=self.bulk_delete,
+            ),
+            ft.TextButton("لغو انتخاب", on_click=lambda e: self.set_selection(set())),
+        ]
+        self.show_selection()
+        return ft.Row(
+            spacing=10,
+            wrap=True,
+            controls=[
+                ft.TextButton("انتخاب همه", icon=ft.Icons.SELECT_ALL,
+                              on_click=lambda e: self.set_selection(set(self.listed_ids))),
+                self.selection_label,
+                self.bulk_group,
+                self.bulk_position,
+            ] + self.bulk_controls,
+        )
+    
+    def show_selection(self):
+        self.selection_label.value = f"{len(self.selected_ids)} مورد انتخاب شده"
+        for control in self.bulk_controls:
+            control.disabled = not self.selected_ids
+    
+    def select_contact(self, contact_id, selected):
+        # A row's checkbox changed
+        if selected:
+            self.selected_ids.add(contact_id)
+        else:
+            self.selected_ids.discard(contact_id)
+        self.show_selection()
+        self.page.update()
+    
+    def set_selection(self, ids):
+        # Replace the selection and tick the rows on screen to match
+        self.selected_ids = ids
+        for row in self.contacts_container.controls:
+            if isinstance(row, ContactRow):
+                row.set_selected(row.contact["id"] in ids)
+        self.show_selection()
+        self.page.update()
+    
+    def bulk_update(self, e):
+        # Move the selected contacts to a group and/or give them a position
+        updates = {}
+        if self.bulk_group.value:
+            updates["group_name"] = self.bulk_group.value
+        if self.bulk_position.value and self.bulk_position.value.strip():
+            updates["position"] = self.bulk_position.value.strip()
+        if not updates:
+            self.show_validation_error("گروه یا سمت جدید را وارد کنید")
+            return
+        
+        updated, message = self.db.update_many(updates, ids=self.selected_ids)
+        if not updated:
+            self.show_validation_error(message)
+            return
+        self.bulk_group.value = None
+        self.bulk_position.value = ""
+        self.selected_ids = set()
+        self.load_contacts()
+        self.show_success_message(f"{updated} مخاطب به‌روزرسانی شد")
+    
+    def bulk_delete(self, e):
+        # Ask first, then delete the selected contacts with one statement and
+        # one reload; exactly the ids counted in the question are deleted
+        ids = set(self.selected_ids)
+        if not ids:
+            return
+        self.confirm_delete(f"{len(ids)} مخاطب انتخاب‌شده حذف شود؟", lambda: self.delete_selected(ids))
+    
+    def delete_selected(self, ids):
+        deleted = self.db.delete_many(ids=ids)
+        self.selected_ids = set()
+        if deleted:
+            self.purge_photos()
+        self.load_contacts()
+        self.show_success_message(f"{deleted} مخاطب حذف شد")
+    
+    def handle_export_result(self, e: ft.FilePickerResultEvent):
+        # Export the current search results to the chosen file
+        if not e.path:
+            return
+        
+        from export import export_to_file
+        
+        filters, facets = self.list_filters()
+        try:
+            export_to_file(self.db, e.path, filters=filters, facets=facets)
+            self.show_success_message(f"خروجی ذخیره شد: {os.path.basename(e.path)}")
+        except Exception as ex:
+            self.show_validation_error(f"خطا در ذخیره خروجی: {str(ex)}")
 
     def create_table_header(self):
-        # Create table header row
-        headers = ["#", "عکس", "نام", "نام خانوادگی", "گروه آموزشی", "سمت اجرایی", "ایمیل", "تلفن"]
-        if self.is_admin:
-            headers.append("عملیات")
+        # Create table header row (once; the actions column follows the role)
+        if self.table_header is not None:
+            return self.table_header
         
+        headers = ["#", "عکس", "نام", "نام خانوادگی", "گروه آموزشی", "سمت اجرایی", "ایمیل", "تلفن", "عملیات"]
         header_cells = []
-        widths = [50, 80, 100, 100, 100, 100, 130, 100, 100] if self.is_admin else [50, 80, 100, 100, 100, 100, 130, 100]
+        widths = [50, 80, 100, 100, 100, 100, 130, 100, 140]
         
         for i, header in enumerate(headers):
             header_cells.append(
@@ -418,18 +657,78 @@ class PhoneBookApp:
                 )
             )
         
-        return ft.Container(
+        self.actions_header = header_cells[-1]
+        self.actions_header.visible = self.is_admin
+        self.table_header = ft.Container(
             ft.Row(header_cells, spacing=0),
             padding=ft.padding.only(bottom=10),
         )
+        return self.table_header
 
-    def load_contacts(self, e=None):
-        # Load and display contacts
-        self.contacts_container.controls.clear()
-        self.contacts_container.controls.append(self.create_table_header())
-        
+    def group_options(self):
+        # Default groups plus any group already in use, for the dialogs' dropdowns
+        options = list(DEFAULT_GROUPS)
+        options += [value for value, _ in self.db.facets('group_name') if value not in options]
+        return options
+    
+    def refresh_facets(self):
+        # Rebuild the group chips from the maintained counts
+        selected = self.search_fields["group_name"].value
+        facets = self.db.facets('group_name')
+        self.facet_row.controls = [
+            ft.Chip(
+                label=ft.Text(f"{value} ({count})", size=12),
+                selected=value == selected,
+                selected_color=ft.Colors.ORANGE_100,
+                on_select=lambda e, value=value: self.toggle_group_facet(value),
+            )
+            for value, count in facets
+        ]
+        groups = list(DEFAULT_GROUPS) + [value for value, _ in facets if value not in DEFAULT_GROUPS]
+        self.bulk_group.options = [ft.dropdown.Option(g) for g in groups]
+    
+    def toggle_group_facet(self, value):
+        # Filter by a group chip, or clear the filter if it is already selected
+        field = self.search_fields["group_name"]
+        field.value = "" if field.value == value else value
+        self.group_facet = field.value or None
+        self.load_contacts()
+    
+    def list_filters(self):
+        # (filters, facets) for the search fields, shared by the list and the export
         filters = {key: field.value for key, field in self.search_fields.items()}
-        contacts = self.db.search(filters)
+        facets = None
+        if self.group_facet and filters["group_name"] == self.group_facet:
+            # A chip: list exactly the rows its count is for, not every
+            # group containing its text
+            facets = {"group_name": filters.pop("group_name")}
+        return filters, facets
+    
+    def load_contacts(self, e=None):
+        # Load and display contacts. The first FIRST_PAGE_ROWS rows are painted
+        # right away and the rest are appended in chunks; a newer call (another
+        # search) stops an older one between chunks.
+        with self.list_lock:
+            self.list_generation += 1
+            generation = self.list_generation
+            for future in self.photo_loads:
+                future.cancel()
+            self.photo_loads = []
+        
+        filters, facets = self.list_filters()
+        contacts = self.db.search(filters, facets=facets)
+        
+        with self.list_lock:
+            if generation != self.list_generation:
+                return
+            
+            # Keep only selected rows that are still listed
+            self.listed_ids = [contact["id"] for contact in contacts]
+            self.selected_ids &= set(self.listed_ids)
+            self.show_selection()
+            
+            self.contacts_container.controls.clear()
+            self.contacts_container.controls.append(self.create_table_header())
         
         if not contacts:
             empty_row = ft.Container(
@@ -446,31 +745,102 @@ class PhoneBookApp:
                 padding=10,
                 margin=ft.margin.only(bottom=5),
             )
-            self.contacts_container.controls.append(empty_row)
-        else:
-            for contact in contacts:
-                row = ContactRow(
+            with self.list_lock:
+                if generation != self.list_generation:
+                    return
+                self.contacts_container.controls.append(empty_row)
+                self.refresh_facets()
+                self.page.update()
+            return
+        
+        start = 0
+        chunk = FIRST_PAGE_ROWS
+        while start < len(contacts):
+            if generation != self.list_generation:
+                return
+            rows = [
+                ContactRow(
                     contact=contact,
                     is_admin=self.is_admin,
                     on_edit=self.edit_contact,
-                    on_delete=self.delete_contact
+                    on_delete=self.confirm_delete_contact,
+                    on_select=self.select_contact,
+                    selected=contact["id"] in self.selected_ids,
                 )
-                self.contacts_container.controls.append(row)
-        
-        self.page.update()
+                for contact in contacts[start:start + chunk]
+            ]
+            with self.list_lock:
+                if generation != self.list_generation:
+                    return
+                self.contacts_container.controls.extend(rows)
+                if start == 0:
+                    self.refresh_facets()
+                self.page.update()
+                self.load_row_photos(rows, generation)
+            start += chunk
+            chunk = STREAM_CHUNK_ROWS
+
+    def load_row_photos(self, rows, generation):
+        # Fetch row photos on the loader pool after the rows are on screen.
+        # load_contacts cancels loads still queued for a previous list; ones
+        # already running notice the newer generation and drop their result.
+        self.photo_loads.extend(
+            self.photo_loader.submit(self.load_row_photo, row, generation)
+            for row in rows
+            if row.contact.get("photo_path")
+        )
+
+    def load_row_photo(self, row, generation):
+        if generation != self.list_generation:
+            return
+        try:
+            data = self.read_photo(row.contact.get("photo_path"))
+        except OSError:
+            return
+        if generation == self.list_generation:
+            row.set_photo(data)
+
+    def read_photo(self, photo_path):
+        # Row photo bytes: the packed thumbnail if there is one, else the photo
+        # file (its thumbnail is packed for next time)
+        if self.thumbs is None:
+            with open(photo_path, 'rb') as f:
+                return f.read()
+        data = self.thumbs.get(photo_path)
+        if data is not None:
+            return data
+        from imaging import make_thumbnail
+        try:
+            data = make_thumbnail(photo_path)
+        except Exception:
+            # Not an image Pillow can read; show the file as it is, don't pack it
+            with open(photo_path, 'rb') as f:
+                return f.read()
+        self.thumbs.put(photo_path, data)
+        return data
 
     def toggle_role(self, e):
-        # Switch between admin and user roles
+        # Switch between admin and user roles by showing/hiding the admin-only
+        # controls; no DB query and no rebuilding of the existing rows
         self.is_admin = e.control.value
-        self.page.controls.clear()
-        self.build_ui()
-        self.load_contacts()
+        self.show_role()
+        self.admin_actions.visible = self.is_admin
+        self.create_table_header()
+        self.actions_header.visible = self.is_admin
+        for row in self.contacts_container.controls:
+            if isinstance(row, ContactRow):
+                row.set_admin(self.is_admin)
         self.page.update()
 
+    def show_role(self):
+        self.role_icon.name = ft.Icons.ADMIN_PANEL_SETTINGS if self.is_admin else ft.Icons.PERSON
+        self.role_label.value = "مدیر سیستم" if self.is_admin else "کاربر عادی"
+
     def clear_search(self, e):
         # Clear search fields
         for field in self.search_fields.values():
             field.value = ""
+        self.group_facet = None
         self.load_contacts()
 
     def create_photo_preview(self, photo_path):
@@ -481,12 +851,12 @@ class PhoneBookApp:
                     image_bytes = f.read()
                     base64_image = base64.b64encode(image_bytes).decode()
                 
-                return ft.Image(
-                    src_base64=base64_image,
+                return ft.Container(
+                    content=self.preview_image(base64_image),
                     width=120,
                     height=120,
-                    fit=ft.ImageFit.COVER,
                     border_radius=60,
+                    alignment=ft.alignment.center,
                 )
             except:
                 pass
@@ -500,8 +870,66 @@ class PhoneBookApp:
             alignment=ft.alignment.center,
         )
 
+    def preview_image(self, base64_image):
+        return ft.Image(
+            src_base64=base64_image,
+            width=120,
+            height=120,
+            fit=ft.ImageFit.COVER,
+            border_radius=60,
+        )
+
+    def process_selected_photo(self, src_path, photo_preview, is_current):
+        # Queue a picked photo on the image pool; the preview shows a spinner
+        # until the thumbnail is ready. Returns the pending future.
+        photo_preview.content = ft.ProgressRing(width=30, height=30)
+        photo_preview.update()
+        # A new pick replaces the previous one
+        self.discard_pending_photo()
+
+        def on_done(future):
+            # Runs on a pool thread; ignore results for a photo that was replaced
+            if not is_current(src_path):
+                return
+            try:
+                processed = future.result()
+                photo_preview.content = self.preview_image(base64.b64encode(processed.thumbnail).decode())
+            except Exception:
+                photo_preview.content = ft.Icon(ft.Icons.BROKEN_IMAGE, size=50, color=ft.Colors.GREY_400)
+            try:
+                photo_preview.update()
+            except Exception:
+                pass
+
+        self.pending_photo = self.image_pipeline.submit(src_path, on_done=on_done)
+        return self.pending_photo
+
+    def discard_pending_photo(self):
+        # Remove the processed file of a pick that won't be saved (once it is ready)
+        future, self.pending_photo = self.pending_photo, None
+        if future is None:
+            return
+
+        def discard(future):
+            if not future.cancelled() and future.exception() is None:
+                future.result().discard()
+
+        future.add_done_callback(discard)
+
+    def store_processed_photo(self, future):
+        # Wait for a queued photo and add it to the store; returns the photo_path
+        processed = future.result(timeout=60)
+        try:
+            path = self.photo_store.put(processed.path)
+            if self.thumbs is not None:
+                self.thumbs.put(path, processed.thumbnail)
+            return path
+        finally:
+            processed.discard()
+
     def close_dialog(self):
-        # Close current dialog
+        # Close current dialog, dropping a photo it didn't save
+        self.discard_pending_photo()
         if self.current_dialog:
             self.page.overlay.remove(self.current_dialog)
             self.current_dialog = None
@@ -512,6 +940,7 @@ class PhoneBookApp:
         self.close_dialog()
         
         selected_photo_path = None
+        photo_job = None
         photo_preview = self.create_photo_preview(None)
         
         # Form fields
@@ -554,15 +983,7 @@ class PhoneBookApp:
             label="گروه آموزشی *",
             width=400,
             border_color=ft.Colors.ORANGE_400,
-            options=[
-                ft.dropdown.Option("برق"),
-                ft.dropdown.Option("مکانیک"),
-                ft.dropdown.Option("کامپیوتر"),
-                ft.dropdown.Option("IT"),
-                ft.dropdown.Option("نرم‌افزار"),
-                ft.dropdown.Option("معماری"),
-                ft.dropdown.Option("شیمی"),
-            ],
+            options=[ft.dropdown.Option(g) for g in self.group_options()],
             hint_text="انتخاب کنید"
         )
         
@@ -570,7 +991,7 @@ class PhoneBookApp:
         
         def handle_photo_selection(e: ft.FilePickerResultEvent):
             # Handle photo file selection
-            nonlocal selected_photo_path
+            nonlocal selected_photo_path, photo_job
             
             if e.files and len(e.files) > 0:
                 selected_file = e.files[0]
@@ -580,25 +1001,11 @@ class PhoneBookApp:
                 if file_ext not in allowed_extensions:
                     return
                 
-                try:
-                    selected_photo_path = selected_file.path
-                    
-                    with open(selected_photo_path, 'rb') as f:
-                        image_bytes = f.read()
-                        photo_base64 = base64.b64encode(image_bytes).decode()
-                    
-                    photo_preview.content = ft.Image(
-                        src_base64=photo_base64,
-                        width=100,
-                        height=100,
-                        fit=ft.ImageFit.COVER,
-                        border_radius=60,
-                    )
-                    
-                    photo_preview.update()
-                    
-                except Exception:
-                    pass
+                selected_photo_path = selected_file.path
+                photo_job = self.process_selected_photo(
+                    selected_photo_path, photo_preview,
+                    lambda source: source == selected_photo_path,
+                )
         
         file_picker.on_result = handle_photo_selection
         self.page.overlay.append(file_picker)
@@ -637,15 +1044,10 @@ class PhoneBookApp:
                 'photo_path': ''
             }
             
-            # Save photo if selected
-            if selected_photo_path:
+            # Save photo if selected (stored once per content)
+            if photo_job:
                 try:
-                    file_ext = os.path.splitext(selected_photo_path)[1]
-                    unique_filename = f"{uuid.uuid4()}{file_ext}"
-                    save_path = os.path.join(self.photos_dir, unique_filename)
-                    
-                    shutil.copy2(selected_photo_path, save_path)
-                    contact_data['photo_path'] = save_path
+                    contact_data['photo_path'] = self.store_processed_photo(photo_job)
                 except Exception:
                     pass
             
@@ -777,60 +1179,21 @@ class PhoneBookApp:
 
     def show_add_csv_dialog(self, e):
         # Show CSV import dialog
+        from photo_import import import_contacts, read_csv
+        
         self.close_dialog()
         
-        contacts_from_file = []
+        import_state = {'csv_path': None, 'photos_path': None, 'valid_rows': 0}
         
         def handle_file_pick(e: ft.FilePickerResultEvent):
-            # Process CSV file
-            contacts_from_file.clear()
+            # Validate the CSV; rows are imported on save
+            import_state['csv_path'] = None
             
             if e.files and e.files[0].path:
                 try:
                     file_path = e.files[0].path
-                    with open(file_path, 'r', encoding='utf-8-sig') as file:
-                        file_content = file.read()
-                    
-                    csv_file = StringIO(file_content)
-                    reader = csv.DictReader(csv_file)
-                    
-                    required_columns = ["first_name", "last_name", "group_name", "phone"]
-                    
-                    if reader.fieldnames:
-                        missing_headers = [col for col in required_columns if col not in reader.fieldnames]
-                        if missing_headers:
-                            self.show_validation_error(f"ستون‌های ضروری وجود ندارند: {', '.join(missing_headers)}")
-                            return
-                    
-                    row_num = 0
-                    valid_rows = 0
-                    invalid_rows = []
-                    
-                    for row in reader:
-                        row_num += 1
-                        
-                        # Validate required fields
-                        missing_columns = [col for col in required_columns if not row.get(col)]
-                        if missing_columns:
-                            invalid_rows.append(f"ردیف {row_num}: فیلدهای خالی {', '.join(missing_columns)}")
-                            continue
-                        
-                        # Validate phone
-                        phone_value = row.get('phone', '').strip()
-                        is_valid, formatted_phone = self.validate_phone(phone_value)
-                        if not is_valid:
-                            invalid_rows.append(f"ردیف {row_num}: شماره تلفن نامعتبر - {phone_value}")
-                            continue
-                        
-                        contacts_from_file.append({
-                            'first_name': row.get('first_name', '').strip(),
-                            'last_name': row.get('last_name', '').strip(),
-                            'group_name': row.get('group_name', '').strip(),
-                            'position': row.get('position', '').strip(),
-                            'email': row.get('email', '').strip(),
-                            'phone': formatted_phone
-                        })
-                        valid_rows += 1
+                    rows, invalid = read_csv(file_path)
+                    invalid_rows = [f"ردیف {row_num}: {message}" for row_num, message in invalid]
                     
                     if invalid_rows and len(invalid_rows) > 0:
                         error_msg = f"{len(invalid_rows)} ردیف نامعتبر یافت شد"
@@ -840,9 +1203,11 @@ class PhoneBookApp:
                             error_msg += f" (نمایش 3 مورد اول):\n" + "\n".join(invalid_rows[:3])
                         self.show_validation_error(error_msg)
                     
-                    if contacts_from_file:
+                    if rows:
+                        import_state['csv_path'] = file_path
+                        import_state['valid_rows'] = len(rows)
                         save_button.disabled = False
-                        self.show_success_message(f"{valid_rows} ردیف معتبر یافت شد")
+                        self.show_success_message(f"{len(rows)} ردیف معتبر یافت شد")
                     else:
                         save_button.disabled = True
                         self.show_validation_error("هیچ ردیف معتبری یافت نشد")
@@ -852,42 +1217,64 @@ class PhoneBookApp:
             
             self.page.update()
         
-        def save_contacts_from_file(e):
-            # Save all valid contacts from CSV
-            if not contacts_from_file:
-                return
-            
-            success_count = 0
-            error_count = 0
-            duplicate_count = 0
-            
-            for contact in contacts_from_file:
-                success, message = self.db.add_contact(contact)
-                if success:
-                    success_count += 1
-                elif "قبلاً ثبت شده" in message:
-                    duplicate_count += 1
-                else:
-                    error_count += 1
+        def handle_photos_pick(e):
+            # Folder (directory picker) or zip file (file picker) of photos
+            if isinstance(e, ft.FilePickerResultEvent) and e.files:
+                path = e.files[0].path
+            else:
+                path = getattr(e, 'path', None)
+            if path:
+                import_state['photos_path'] = path
+                photos_label.value = os.path.basename(path.rstrip(os.sep)) or path
+                self.page.update()
+        
+        def report_progress(stage, done, total):
+            # Called from the import thread
+            progress_bar.value = done / total if total else 1
+            progress_text.value = f"{'پردازش تصاویر' if stage == 'photos' else 'ذخیره ردیف‌ها'}: {done}/{total}"
+            self.page.update()
+        
+        def run_import():
+            try:
+                added, duplicates, errors = import_contacts(
+                    self.db, import_state['csv_path'], import_state['photos_path'],
+                    store=self.photo_store, pipeline=self.image_pipeline,
+                    thumbs=self.thumbs, progress=report_progress,
+                    on_duplicate='update' if update_duplicates.value else 'skip',
+                )
+            except Exception as e:
+                added, duplicates, errors = 0, [], [(None, str(e))]
             
             self.close_dialog()
             self.load_contacts()
             
             result_msg = f"نتیجه:\n"
-            result_msg += f"✅ {success_count} مخاطب اضافه شد\n"
-            if duplicate_count > 0:
-                result_msg += f"⚠️ {duplicate_count} تکراری\n"
-            if error_count > 0:
-                result_msg += f"❌ {error_count} خطا"
+            result_msg += f"✅ {added} مخاطب اضافه شد\n"
+            if duplicates:
+                result_msg += f"⚠️ {len(duplicates)} تکراری{' (به‌روزرسانی شد)' if update_duplicates.value else ''}\n"
+            if errors:
+                result_msg += f"❌ {len(errors)} خطا\n"
+                result_msg += "\n".join(f"{where}: {message}" for where, message in errors[:3])
             
             self.page.snack_bar = ft.SnackBar(
                 content=ft.Text(result_msg, color=ft.Colors.WHITE),
-                bgcolor=ft.Colors.GREEN_400 if success_count > 0 else ft.Colors.ORANGE_400,
+                bgcolor=ft.Colors.GREEN_400 if added > 0 else ft.Colors.ORANGE_400,
                 duration=5000,
             )
             self.page.snack_bar.open = True
             self.page.update()
         
+        def save_contacts_from_file(e):
+            # Import valid rows (and matched photos) in the background
+            if not import_state['csv_path']:
+                return
+            
+            save_button.disabled = True
+            progress_bar.visible = True
+            progress_text.visible = True
+            self.page.update()
+            threading.Thread(target=run_import, daemon=True).start()
+        
         def close_dialog_local(e):
             # Close dialog
             self.close_dialog()
@@ -896,6 +1283,15 @@ class PhoneBookApp:
         file_picker.on_result = handle_file_pick
         self.page.overlay.append(file_picker)
         
+        photos_picker = ft.FilePicker()
+        photos_picker.on_result = handle_photos_pick
+        self.page.overlay.append(photos_picker)
+        
+        photos_label = ft.Text("بدون تصویر", size=11, color=ft.Colors.GREY_600)
+        update_duplicates = ft.Checkbox(label="به‌روزرسانی مخاطبین تکراری", value=False)
+        progress_bar = ft.ProgressBar(width=500, value=0, color=ft.Colors.ORANGE_400, visible=False)
+        progress_text = ft.Text("", size=11, color=ft.Colors.GREY_700, visible=False)
+        
         save_button = ft.ElevatedButton(
             "ذخیره مخاطبین",
             icon=ft.Icons.SAVE,
@@ -933,13 +1329,43 @@ class PhoneBookApp:
                     ], spacing=20, alignment=ft.MainAxisAlignment.START),
                 ], spacing=10),
                 
+                ft.Column([
+                    ft.Text("تصاویر (اختیاری)", size=14, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_800),
+                    ft.Text("پوشه یا فایل ZIP؛ تطبیق با ستون photo، شماره تلفن یا نام", size=11, color=ft.Colors.GREY_600),
+                    
+                    ft.Row([
+                        ft.ElevatedButton(
+                            "انتخاب پوشه",
+                            icon=ft.Icons.FOLDER_OPEN,
+                            on_click=lambda e: photos_picker.get_directory_path(),
+                            bgcolor=ft.Colors.ORANGE_400,
+                            color=ft.Colors.WHITE,
+                        ),
+                        ft.ElevatedButton(
+                            "انتخاب فایل ZIP",
+                            icon=ft.Icons.FOLDER_ZIP,
+                            on_click=lambda e: photos_picker.pick_files(
+                                allowed_extensions=["zip"],
+                                allow_multiple=False
+                            ),
+                            bgcolor=ft.Colors.ORANGE_400,
+                            color=ft.Colors.WHITE,
+                        ),
+                        photos_label,
+                    ], spacing=20, alignment=ft.MainAxisAlignment.START),
+                ], spacing=10),
+                
+                update_duplicates,
+                progress_bar,
+                progress_text,
+                
                 ft.Divider(color=ft.Colors.GREY_300),
                 
                 ft.Container(
                     content=ft.Column([
                         ft.Text("راهنمای فرمت فایل CSV:", size=12, weight=ft.FontWeight.BOLD, color=ft.Colors.GREY_700),
                         ft.Text("• ستون‌های اجباری: first_name, last_name, group_name, phone", size=10, color=ft.Colors.GREY_600),
-                        ft.Text("• ستون‌های اختیاری: position, email", size=10, color=ft.Colors.GREY_600),
+                        ft.Text("• ستون‌های اختیاری: position, email, photo (نام فایل تصویر)", size=10, color=ft.Colors.GREY_600),
                         ft.Text("• فایل باید با UTF-8 ذخیره شده باشد", size=10, color=ft.Colors.GREY_600),
                         ft.Text("• فرمت تلفن: 09123456789 یا 02187654321", size=10, color=ft.Colors.GREY_600),
                         ft.Text("• نمونه فایل: first_name,last_name,group_name,position,email,phone", size=10, color=ft.Colors.GREY_600),
@@ -987,21 +1413,119 @@ class PhoneBookApp:
         self.page.overlay.append(overlay_container)
         self.page.update()
 
+    def show_duplicates_dialog(self, e):
+        # Review near-duplicate pairs and merge the selected ones (older contact kept)
+        self.close_dialog()
+        
+        pair_list = ft.Column(spacing=5, scroll="auto", height=380)
+        status_text = ft.Text("در حال جستجوی موارد تکراری...", size=12, color=ft.Colors.GREY_700)
+        checks = []
+        
+        def describe(contact):
+            return f"#{contact['id']} {contact['first_name']} {contact['last_name']} - {contact['phone']}"
+        
+        def find_pairs():
+            # Runs off the UI thread; blocking keys keep this near-linear
+            from duplicates import find_duplicates
+            
+            pairs = find_duplicates(self.db)[:DUPLICATE_REVIEW_LIMIT]
+            for score, keep_id, drop_id in pairs:
+                keep, drop = self.db.get_by_id(keep_id), self.db.get_by_id(drop_id)
+                if not keep or not drop:
+                    continue
+                check = ft.Checkbox(value=score >= 0.9, data=(keep_id, drop_id))
+                checks.append(check)
+                pair_list.controls.append(ft.Row([
+                    check,
+                    ft.Text(f"{score:.2f}", size=12, weight=ft.FontWeight.BOLD, color=ft.Colors.ORANGE_800, width=40),
+                    ft.Text(describe(keep), size=12, width=300),
+                    ft.Icon(ft.Icons.ARROW_BACK, size=14, color=ft.Colors.GREY_500),
+                    ft.Text(describe(drop), size=12, width=300),
+                ], spacing=10))
+            status_text.value = f"{len(checks)} مورد مشکوک یافت شد" if checks else "مورد تکراری یافت نشد"
+            merge_button.disabled = not checks
+            self.page.update()
+        
+        def merge_selected(e):
+            pairs = [check.data for check in checks if check.value]
+            if not pairs:
+                return
+            merge_button.disabled = True
+            status_text.value = "در حال ادغام..."
+            self.page.update()
+            
+            def run_merge():
+                merged, errors = self.db.merge_contacts(pairs)
+                self.close_dialog()
+                self.load_contacts()
+                self.purge_photos()
+                self.show_success_message(f"{merged} مخاطب ادغام شد")
+            
+            threading.Thread(target=run_merge, daemon=True).start()
+        
+        merge_button = ft.ElevatedButton(
+            "ادغام موارد انتخاب‌شده",
+            icon=ft.Icons.MERGE_TYPE,
+            on_click=merge_selected,
+            bgcolor=ft.Colors.ORANGE_400,
+            color=ft.Colors.WHITE,
+            disabled=True,
+        )
+        
+        form_column = ft.Column(
+            spacing=15,
+            controls=[
+                ft.Row([
+                    ft.Icon(ft.Icons.MERGE_TYPE, color=ft.Colors.ORANGE_600),
+                    ft.Text("مخاطبین تکراری", size=18, weight=ft.FontWeight.BOLD, color=ft.Colors.ORANGE_800),
+                ], alignment=ft.MainAxisAlignment.CENTER),
+                ft.Text("مخاطب سمت راست حفظ می‌شود و فیلدهای خالی آن از مخاطب دوم پر می‌شود", size=11, color=ft.Colors.GREY_600),
+                status_text,
+                pair_list,
+                ft.Row([
+                    ft.ElevatedButton(
+                        "انصراف",
+                        icon=ft.Icons.CANCEL,
+                        on_click=lambda e: self.close_dialog(),
+                        bgcolor=ft.Colors.GREY_200,
+                        color=ft.Colors.GREY_700,
+                    ),
+                    merge_button,
+                ], alignment=ft.MainAxisAlignment.END, spacing=10),
+            ],
+        )
+        
+        overlay_container = ft.Container(
+            content=ft.Container(
+                content=form_column,
+                width=900,
+                height=600,
+                padding=30,
+                bgcolor=ft.Colors.WHITE,
+                border_radius=15,
+                shadow=ft.BoxShadow(blur_radius=20, color=ft.Colors.BLACK54),
+                clip_behavior=ft.ClipBehavior.HARD_EDGE,
+            ),
+            alignment=ft.alignment.center,
+            expand=True,
+            bgcolor=ft.Colors.BLACK54,
+        )
+        
+        self.current_dialog = overlay_container
+        self.page.overlay.append(overlay_container)
+        self.page.update()
+        threading.Thread(target=find_pairs, daemon=True).start()
+
     def edit_contact(self, contact_id):
         # Show edit contact dialog
         self.close_dialog()
         
-        contacts = self.db.get_all()
-        contact_to_edit = None
-        for contact in contacts:
-            if contact.get("id") == contact_id:
-                contact_to_edit = contact
-                break
-        
+        contact_to_edit = self.db.get_by_id(contact_id)
         if not contact_to_edit:
             return
         
         selected_photo_path = None
+        photo_job = None
         current_photo_path = contact_to_edit.get("photo_path")
         photo_preview = self.create_photo_preview(current_photo_path)
         
@@ -1019,10 +1543,7 @@ class PhoneBookApp:
             border_color=ft.Colors.ORANGE_400
         )
         
-        group_options = [
-            "برق", "مکانیک", "کامپیوتر", "IT", 
-            "نرم‌افزار", "معماری", "شیمی"
-        ]
+        group_options = self.group_options()
         
         group_dropdown = ft.Dropdown(
             label="گروه آموزشی *",
@@ -1078,7 +1599,7 @@ class PhoneBookApp:
         
         def handle_photo_selection(e: ft.FilePickerResultEvent):
             # Handle photo file selection
-            nonlocal selected_photo_path
+            nonlocal selected_photo_path, photo_job
             
             if e.files and len(e.files) > 0:
                 selected_file = e.files[0]
@@ -1088,25 +1609,11 @@ class PhoneBookApp:
                 if file_ext not in allowed_extensions:
                     return
                 
-                try:
-                    selected_photo_path = selected_file.path
-                    
-                    with open(selected_photo_path, 'rb') as f:
-                        image_bytes = f.read()
-                        photo_base64 = base64.b64encode(image_bytes).decode()
-                    
-                    photo_preview.content = ft.Image(
-                        src_base64=photo_base64,
-                        width=120,
-                        height=120,
-                        fit=ft.ImageFit.COVER,
-                        border_radius=60,
-                    )
-                    
-                    photo_preview.update()
-                    
-                except Exception:
-                    pass
+                selected_photo_path = selected_file.path
+                photo_job = self.process_selected_photo(
+                    selected_photo_path, photo_preview,
+                    lambda source: source == selected_photo_path,
+                )
         
         file_picker.on_result = handle_photo_selection
         self.page.overlay.append(file_picker)
@@ -1144,31 +1651,22 @@ class PhoneBookApp:
                 'phone': formatted_phone
             }
             
-            # Update photo if changed
-            if selected_photo_path:
+            # Update photo if changed; the old one is released by the DB trigger
+            if photo_job:
                 try:
-                    file_ext = os.path.splitext(selected_photo_path)[1]
-                    unique_filename = f"{uuid.uuid4()}{file_ext}"
-                    save_path = os.path.join(self.photos_dir, unique_filename)
-                    
-                    if current_photo_path and os.path.exists(current_photo_path):
-                        try:
-                            os.remove(current_photo_path)
-                        except:
-                            pass
-                    
-                    shutil.copy2(selected_photo_path, save_path)
-                    updated_data['photo_path'] = save_path
-                    
+                    updated_data['photo_path'] = self.store_processed_photo(photo_job)
                 except Exception:
                     pass
             
-            success, _ = self.db.update(contact_id, updated_data)
+            success, message = self.db.update(contact_id, updated_data)
             
             if success:
+                self.purge_photos()
                 self.close_dialog()
                 self.load_contacts()
                 self.show_success_message("مخاطب با موفقیت به‌روزرسانی شد")
+            elif message == DUPLICATE_MESSAGE:
+                self.show_validation_error(message)
             else:
                 self.show_validation_error("خطا در به‌روزرسانی")
         
@@ -1290,24 +1788,84 @@ class PhoneBookApp:
         self.page.overlay.append(overlay_container)
         self.page.update()
 
+    def confirm_delete_contact(self, contact_id):
+        # Row delete button: ask before deleting
+        contact = self.db.get_by_id(contact_id)
+        if not contact:
+            self.load_contacts()
+            return
+        name = f"{contact['first_name']} {contact['last_name']}"
+        self.confirm_delete(f"مخاطب «{name}» حذف شود؟", lambda: self.delete_contact(contact_id))
+    
+    def confirm_delete(self, message, on_confirm):
+        # Delete confirmation dialog shared by single and bulk delete
+        self.close_dialog()
+        
+        def confirm(e):
+            self.close_dialog()
+            on_confirm()
+        
+        form_column = ft.Column(
+            spacing=15,
+            tight=True,
+            controls=[
+                ft.Row([
+                    ft.Icon(ft.Icons.WARNING_AMBER, color=ft.Colors.RED_400),
+                    ft.Text("تأیید حذف", size=18, weight=ft.FontWeight.BOLD, color=ft.Colors.RED_400),
+                ], alignment=ft.MainAxisAlignment.CENTER),
+                ft.Text(message, size=14, color=ft.Colors.GREY_800, text_align=ft.TextAlign.CENTER),
+                ft.Text("این کار قابل بازگشت نیست", size=11, color=ft.Colors.GREY_600, text_align=ft.TextAlign.CENTER),
+                ft.Row([
+                    ft.ElevatedButton(
+                        "انصراف",
+                        icon=ft.Icons.CANCEL,
+                        on_click=lambda e: self.close_dialog(),
+                        bgcolor=ft.Colors.GREY_200,
+                        color=ft.Colors.GREY_700,
+                    ),
+                    ft.ElevatedButton(
+                        "حذف",
+                        icon=ft.Icons.DELETE,
+                        on_click=confirm,
+                        bgcolor=ft.Colors.RED_400,
+                        color=ft.Colors.WHITE,
+                    ),
+                ], alignment=ft.MainAxisAlignment.END, spacing=10),
+            ],
+        )
+        
+        overlay_container = ft.Container(
+            content=ft.Container(
+                content=form_column,
+                width=420,
+                padding=30,
+                bgcolor=ft.Colors.WHITE,
+                border_radius=15,
+                shadow=ft.BoxShadow(blur_radius=20, color=ft.Colors.BLACK54),
+            ),
+            alignment=ft.alignment.center,
+            expand=True,
+            bgcolor=ft.Colors.BLACK54,
+        )
+        
+        self.current_dialog = overlay_container
+        self.page.overlay.append(overlay_container)
+        self.page.update()
+    
     def delete_contact(self, contact_id):
-        # Delete contact and associated photo
+        # Delete contact; its photo reference is released by the DB trigger
         success, _ = self.db.delete(contact_id)
         
         if success:
-            contacts = self.db.get_all()
-            for contact in contacts:
-                if contact.get("id") == contact_id and contact.get("photo_path"):
-                    try:
-                        photo_path = contact.get("photo_path")
-                        if os.path.exists(photo_path):
-                            os.remove(photo_path)
-                    except:
-                        pass
+            self.purge_photos()
         
         self.load_contacts()
         self.show_success_message("مخاطب با موفقیت حذف شد")
 
+    def purge_photos(self):
+        # Remove photos no contact references any more, off the UI thread
+        threading.Thread(target=self.photo_store.purge, daemon=True).start()
+
     def build_ui(self):
         # Build main UI layout
         self.page.add(
@@ -0,0 +1,236 @@
+# maintenance.py - Low-priority SQLite upkeep: checkpoints, incremental vacuum, optimize, ANALYZE
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from database import PhoneBookDB
+
+MAINTENANCE_INTERVAL = 60
+# A run is skipped if the WAL was written to this recently or the write lock is taken
+IDLE_SECONDS = 5
+# Freed pages returned to the filesystem per run
+VACUUM_PAGES = 256
+# WAL pages written since the last PRAGMA optimize / ANALYZE that trigger another
+OPTIMIZE_PAGES = 1000
+ANALYZE_PAGES = 20000
+ANALYZE_INTERVAL = 24 * 3600
+# Rows sampled per index by ANALYZE, so it stays cheap on big tables
+ANALYSIS_LIMIT = 1000
+STATUS_KEY = 'maintenance'
+
+
+class Maintenance:
+    # One maintenance pass at a time over a PhoneBookDB file:
+    #  - PRAGMA wal_checkpoint(PASSIVE): copies what it can without waiting
+    #    for readers; the frame counts it reports measure write churn
+    #  - PRAGMA incremental_vacuum(VACUUM_PAGES): gives freed pages back
+    #    (needs auto_vacuum=INCREMENTAL; convert older files with `vacuum`)
+    #  - PRAGMA optimize after OPTIMIZE_PAGES written, ANALYZE (sampled)
+    #    after ANALYZE_PAGES or once a day
+    # Last run times and reclaimed bytes are kept in the settings table. A
+    # pass saves them only when one of the last three tasks ran: passes that
+    # were skipped or only checkpointed update the status in memory, and it
+    # is saved with the next pass that did work.
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._wal_frames = 0
+        self.status = None
+
+    def _connect(self):
+        # No busy wait: maintenance gives way instead of queueing behind writers
+        conn = self.db._get_conn()
+        conn.row_factory = None
+        conn.isolation_level = None
+        conn.execute("PRAGMA busy_timeout=0")
+        return conn
+
+    def load_status(self, conn=None):
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE name = ?", (STATUS_KEY,)).fetchone()
+        finally:
+            if own:
+                conn.close()
+        self.status = json.loads(row[0]) if row else {
+            "last_run": {}, "reclaimed_bytes": 0, "last_reclaimed_bytes": 0,
+            "pages_since_optimize": 0, "pages_since_analyze": 0, "skipped": 0, "last_skip": None,
+        }
+        return self.status
+
+    def _save_status(self, conn):
+        conn.execute(
+            "INSERT INTO settings (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (STATUS_KEY, json.dumps(self.status))
+        )
+
+    def busy(self):
+        # Reason to skip this run, or None
+        try:
+            if time.time() - os.path.getmtime(self.db.db_name + "-wal") < IDLE_SECONDS:
+                return "recent writes"
+        except OSError:
+            pass
+        return None
+
+    def run(self, force=False):
+        # One pass; returns the status dict. force=True ignores recent activity
+        # and the page thresholds (the write lock is still never waited for).
+        with self._lock:
+            conn = self._connect()
+            try:
+                status = self.status if self.status is not None else self.load_status(conn)
+                reason = None if force else self.busy()
+                ran = False
+                if reason is None:
+                    try:
+                        ran = self._run(conn, status, force)
+                    except sqlite3.OperationalError as e:
+                        if "locked" not in str(e) and "busy" not in str(e):
+                            raise
+                        reason = "database locked"
+                if reason:
+                    status["skipped"] += 1
+                    status["last_skip"] = [time.time(), reason]
+                if ran:
+                    try:
+                        self._save_status(conn)
+                    except sqlite3.OperationalError:
+                        pass
+                return status
+            finally:
+                conn.close()
+
+    def _run(self, conn, status, force):
+        # Returns True if vacuum, optimize or ANALYZE ran
+        now = time.time()
+        ran = False
+        last = status["last_run"]
+
+        _, frames, _ = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        # The WAL restarts from the beginning after a complete checkpoint
+        written = frames - self._wal_frames if frames >= self._wal_frames else frames
+        self._wal_frames = frames
+        status["pages_since_optimize"] += max(written, 0)
+        status["pages_since_analyze"] += max(written, 0)
+        last["checkpoint"] = now
+
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        reclaimed = 0
+        if free and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            # executescript steps the pragma to completion; execute() stops after one page
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            reclaimed = (free - conn.execute("PRAGMA freelist_count").fetchone()[0]) * page_size
+            last["incremental_vacuum"] = now
+            ran = True
+        status["last_reclaimed_bytes"] = reclaimed
+        status["reclaimed_bytes"] += reclaimed
+
+        if force or status["pages_since_optimize"] >= OPTIMIZE_PAGES:
+            conn.execute("PRAGMA optimize")
+            status["pages_since_optimize"] = 0
+            last["optimize"] = now
+            ran = True
+
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone() is not None
+        if (force or not has_stats or status["pages_since_analyze"] >= ANALYZE_PAGES
+                or now - last.get("analyze", 0) >= ANALYZE_INTERVAL):
+            conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+            conn.execute("ANALYZE")
+            status["pages_since_analyze"] = 0
+            last["analyze"] = now
+            ran = True
+        return ran
+
+    def vacuum(self):
+        # Full VACUUM (blocks writers while it runs); also switches older
+        # files to auto_vacuum=INCREMENTAL. Returns bytes reclaimed.
+        with self._lock:
+            conn = self.db._get_conn()
+            conn.row_factory = None
+            conn.isolation_level = None
+            try:
+                before = conn.execute("PRAGMA page_count").fetchone()[0]
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                after = conn.execute("PRAGMA page_count").fetchone()[0]
+                reclaimed = (before - after) * conn.execute("PRAGMA page_size").fetchone()[0]
+                status = self.status if self.status is not None else self.load_status(conn)
+                status["last_run"]["vacuum"] = time.time()
+                status["reclaimed_bytes"] += max(reclaimed, 0)
+                self._save_status(conn)
+                return reclaimed
+            finally:
+                conn.close()
+
+
+class MaintenanceScheduler(threading.Thread):
+    # Runs Maintenance.run() every `interval` seconds on a daemon thread
+    # at a lower CPU priority where the platform allows it
+
+    def __init__(self, maintenance, interval=MAINTENANCE_INTERVAL):
+        super().__init__(name="maintenance", daemon=True)
+        self.maintenance = maintenance
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            # Linux: a thread's native id works as a PRIO_PROCESS target
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.maintenance.run()
+            except Exception as e:
+                print(f"Maintenance failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def describe(status):
+    lines = []
+    for task, when in sorted(status["last_run"].items()):
+        lines.append(f"{task}: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))}")
+    lines.append(f"reclaimed: {status['reclaimed_bytes']} bytes (last run {status['last_reclaimed_bytes']})")
+    lines.append(f"skipped runs: {status['skipped']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite maintenance for the phonebook database")
+    parser.add_argument("command", choices=["run", "status", "vacuum", "schedule"])
+    parser.add_argument("--db", default="phonebook.db")
+    parser.add_argument("--interval", type=float, default=MAINTENANCE_INTERVAL)
+    args = parser.parse_args()
+
+    maintenance = Maintenance(PhoneBookDB(args.db))
+    if args.command == "run":
+        print(describe(maintenance.run(force=True)))
+    elif args.command == "status":
+        print(describe(maintenance.load_status()))
+    elif args.command == "vacuum":
+        print(f"Reclaimed {maintenance.vacuum()} bytes")
+    else:
+        scheduler = MaintenanceScheduler(maintenance, args.interval)
+        scheduler.start()
+        try:
+            scheduler.join()
+        except KeyboardInterrupt:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
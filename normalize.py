@@ -0,0 +1,113 @@
+# normalize.py - Persian-aware text normalization for search
+import re
+import unicodedata
+
+# Arabic letter variants -> Persian forms users type on a Persian keyboard
+_LETTERS = {
+    'ي': 'ی',  # Arabic yeh
+    'ى': 'ی',  # alef maksura
+    'ئ': 'ی',
+    'ك': 'ک',  # Arabic kaf
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ؤ': 'و',
+}
+
+# Persian (U+06F0..) and Arabic-Indic (U+0660..) digits -> ASCII
+_DIGITS = {ord(c): str(i) for i, c in enumerate('۰۱۲۳۴۵۶۷۸۹')}
+_DIGITS.update({ord(c): str(i) for i, c in enumerate('٠١٢٣٤٥٦٧٨٩')})
+
+_TABLE = {ord(k): v for k, v in _LETTERS.items()}
+_TABLE.update(_DIGITS)
+# ZWNJ / ZWJ separate word parts: treat as a space so "نرم‌افزار" == "نرم افزار"
+_TABLE[0x200C] = ' '
+_TABLE[0x200D] = ' '
+# Invisible marks that only get in the way of matching
+for _cp in (0x200B, 0x200E, 0x200F, 0xFEFF, 0x0640):  # ZWSP, LRM, RLM, BOM, tatweel
+    _TABLE[_cp] = None
+# Arabic diacritics (harakat, tanwin, shadda, sukun, superscript alef)
+for _cp in list(range(0x064B, 0x0660)) + [0x0670]:
+    _TABLE[_cp] = None
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_text(value):
+    # Canonical search form: NFKC, Persian letters and digits, no diacritics,
+    # ZWNJ as space, case-folded, single spaces, trimmed
+    if not value:
+        return ''
+    text = unicodedata.normalize('NFKC', str(value)).translate(_TABLE).casefold()
+    return _SPACES.sub(' ', text).strip()
+
+
+def normalize_phone(value):
+    # Canonical phone: ASCII digits, Iranian country code folded to a leading 0
+    if not value:
+        return ''
+    cleaned = re.sub(r'[^\d+]', '', str(value).translate(_DIGITS))
+
+    # Convert +98 to 0
+    if cleaned.startswith('+98'):
+        if cleaned.startswith('+989'):
+            return f"0{cleaned[3:]}"
+        return cleaned[1:]
+
+    # Convert 0098 to 0
+    if cleaned.startswith('0098'):
+        if cleaned.startswith('00989'):
+            return f"0{cleaned[4:]}"
+        return cleaned[2:]
+
+    # Convert 98 to 0
+    if cleaned.startswith('98'):
+        if cleaned.startswith('989'):
+            return f"0{cleaned[2:]}"
+        return cleaned
+
+    # Add leading 0 to mobile numbers
+    if cleaned.startswith('9') and len(cleaned) == 10:
+        return f"0{cleaned}"
+
+    # Add leading 0 to 10-digit numbers
+    if not cleaned.startswith('0') and len(cleaned) == 10:
+        return f"0{cleaned}"
+
+    return cleaned
+
+
+# Accepted Iranian phone shapes after stripping everything but digits and '+'
+PHONE_PATTERNS = [
+    re.compile(r'^\+98\d{10}$'),      # +989121234567
+    re.compile(r'^0098\d{10}$'),       # 00989121234567
+    re.compile(r'^98\d{10}$'),         # 989121234567
+    re.compile(r'^09\d{9}$'),          # 09121234567
+    re.compile(r'^9\d{9}$'),           # 9121234567
+    re.compile(r'^\d{10}$'),           # 09121234567 یا 0211234567
+    re.compile(r'^0\d{10}$'),          # 02112345678
+    re.compile(r'^0\d{2,9}$'),         # Other landlines
+]
+
+
+def validate_phone(phone):
+    # Validate an Iranian phone number; returns (True, canonical) or (False, message)
+    if not phone or not str(phone).strip():
+        return False, "شماره تلفن نمی‌تواند خالی باشد"
+
+    cleaned = re.sub(r'[^\d+]', '', str(phone).translate(_DIGITS))
+    for pattern in PHONE_PATTERNS:
+        if pattern.match(cleaned):
+            return True, normalize_phone(cleaned)
+
+    return False, "شماره تلفن نامعتبر است. فرمت‌های قابل قبول: 09123456789 یا 02187654321"
+
+
+def normalize_field(field, value):
+    # Normalizer for one contacts column
+    if field == 'phone':
+        return normalize_phone(value)
+    return normalize_text(value)
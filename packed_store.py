@@ -0,0 +1,234 @@
+# packed_store.py - Append-only packed thumbnail store read through mmap
+import argparse
+import mmap
+import os
+import struct
+import threading
+
+from imaging import make_thumbnail
+from photo_store import PHOTOS_DIR
+
+# Index record: key length, data offset, data length, then the UTF-8 key
+RECORD = struct.Struct("<HQI")
+TOMBSTONE = 0xFFFFFFFF
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+# Thumbnail cache; rebuildable, so it can sit on fast local storage
+CACHE_DIR = os.environ.get("PHONEBOOK_CACHE_DIR", "thumb_cache")
+
+
+class PackedPhotoStore:
+    # All thumbnails live in one append-only data file (thumbs-<gen>.pack)
+    # with an append-only index log (thumbs-<gen>.idx) that is loaded into a
+    # dict on open. Reads slice the mmapped pack, so rendering a row costs no
+    # open()/read() of its own. compact() writes the live entries to a new
+    # generation and switches CURRENT atomically.
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._map = None
+        self._pack = None
+        self._idx = None
+        self._open(self._current_generation())
+
+    # ---- files ----
+
+    def _current_generation(self):
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _paths(self, gen):
+        return (os.path.join(self.directory, f"thumbs-{gen}.pack"),
+                os.path.join(self.directory, f"thumbs-{gen}.idx"))
+
+    def _open(self, gen):
+        self.generation = gen
+        pack_path, idx_path = self._paths(gen)
+        self.index = self._read_index(idx_path, os.path.getsize(pack_path) if os.path.exists(pack_path) else 0)
+        self._pack = open(pack_path, "ab")
+        self._idx = open(idx_path, "ab")
+        self._map = None
+
+    def _read_index(self, idx_path, pack_size):
+        # Replay the index log; later records win, torn tail records are ignored
+        index = {}
+        if not os.path.exists(idx_path):
+            return index
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + RECORD.size <= len(data):
+            key_len, offset, length = RECORD.unpack_from(data, pos)
+            end = pos + RECORD.size + key_len
+            if end > len(data):
+                break
+            key = data[pos + RECORD.size:end].decode("utf-8")
+            pos = end
+            if length == TOMBSTONE:
+                index.pop(key, None)
+            elif offset + length <= pack_size:
+                index[key] = (offset, length)
+        return index
+
+    def _ensure_map(self, end):
+        # (Re)map the pack when it has grown past what is mapped
+        if end == 0:
+            return
+        if self._map is None or end > len(self._map):
+            if self._map is not None:
+                self._map.close()
+            self._pack.flush()
+            with open(self._paths(self.generation)[0], "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._pack.close()
+            self._idx.close()
+
+    # ---- access ----
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        # Thumbnail bytes for key, or None
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        if length == 0:
+            return b""
+        with self._lock:
+            self._ensure_map(offset + length)
+            return self._map[offset:offset + length]
+
+    def put(self, key, data):
+        # Append a thumbnail (replacing any previous one for key)
+        raw_key = key.encode("utf-8")
+        with self._lock:
+            offset = self._pack.tell()
+            self._pack.write(data)
+            self._pack.flush()
+            self._idx.write(RECORD.pack(len(raw_key), offset, len(data)) + raw_key)
+            self._idx.flush()
+            self.index[key] = (offset, len(data))
+
+    def delete(self, key):
+        if key not in self.index:
+            return
+        raw_key = key.encode("utf-8")
+        with self._lock:
+            self._idx.write(RECORD.pack(len(raw_key), 0, TOMBSTONE) + raw_key)
+            self._idx.flush()
+            self.index.pop(key, None)
+
+    def stats(self):
+        # (live entries, live bytes, pack file bytes)
+        live = sum(length for _, length in self.index.values())
+        return len(self.index), live, self._pack.tell()
+
+    # ---- maintenance ----
+
+    def compact(self):
+        # Rewrite only live entries into a new generation; returns bytes reclaimed
+        with self._lock:
+            old_gen = self.generation
+            old_size = self._pack.tell()
+            new_gen = old_gen + 1
+            pack_path, idx_path = self._paths(new_gen)
+            self._ensure_map(old_size)
+
+            new_index = {}
+            with open(pack_path, "wb") as pack, open(idx_path, "wb") as idx:
+                for key, (offset, length) in self.index.items():
+                    raw_key = key.encode("utf-8")
+                    new_offset = pack.tell()
+                    if length:
+                        pack.write(self._map[offset:offset + length])
+                    idx.write(RECORD.pack(len(raw_key), new_offset, length) + raw_key)
+                    new_index[key] = (new_offset, length)
+                pack.flush()
+                os.fsync(pack.fileno())
+                idx.flush()
+                os.fsync(idx.fileno())
+                new_size = pack.tell()
+
+            current_tmp = os.path.join(self.directory, "CURRENT.tmp")
+            with open(current_tmp, "w") as f:
+                f.write(str(new_gen))
+            os.replace(current_tmp, os.path.join(self.directory, "CURRENT"))
+
+            if self._map is not None:
+                self._map.close()
+            self._pack.close()
+            self._idx.close()
+            self._open(new_gen)
+            for path in self._paths(old_gen):
+                if os.path.exists(path):
+                    os.remove(path)
+            return old_size - new_size
+
+    def migrate_directory(self, photos_dir, make_thumbnail=None):
+        # Pack every image under photos_dir, keyed by the path stored in photo_path.
+        # Returns (packed, skipped, errors).
+        packed = skipped = 0
+        errors = []
+        for folder, dirs, files in os.walk(photos_dir):
+            # Skip work directories such as .incoming
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(folder, name)
+                if path in self.index:
+                    skipped += 1
+                    continue
+                try:
+                    if make_thumbnail:
+                        data = make_thumbnail(path)
+                    else:
+                        with open(path, "rb") as f:
+                            data = f.read()
+                    self.put(path, data)
+                    packed += 1
+                except Exception as e:
+                    errors.append((path, str(e)))
+        return packed, skipped, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed thumbnail store tools")
+    parser.add_argument("command", choices=["migrate", "compact", "stats"])
+    parser.add_argument("--store", default=CACHE_DIR, help="packed store directory")
+    parser.add_argument("--photos", default=PHOTOS_DIR, help="photo directory to migrate")
+    args = parser.parse_args()
+
+    store = PackedPhotoStore(args.store)
+    try:
+        if args.command == "migrate":
+            packed, skipped, errors = store.migrate_directory(args.photos, make_thumbnail)
+            print(f"Packed {packed}, already packed {skipped}, errors {len(errors)}")
+            for path, message in errors:
+                print(f"  {path}: {message}")
+        elif args.command == "compact":
+            print(f"Reclaimed {store.compact()} bytes")
+        else:
+            entries, live, total = store.stats()
+            print(f"{entries} thumbnails, {live} live bytes, {total} bytes in pack")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
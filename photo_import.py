@@ -0,0 +1,216 @@
+# photo_import.py - Bulk import of contacts from CSV with their photos
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import zipfile
+
+from database import PhoneBookDB, REQUIRED_FIELDS, DUPLICATE_MODES
+from imaging import ImagePipeline
+from normalize import normalize_phone, normalize_text, validate_phone
+from packed_store import IMAGE_EXTENSIONS
+from photo_store import PhotoStore, PHOTOS_DIR
+
+IMPORT_COLUMNS = ['first_name', 'last_name', 'group_name', 'position', 'email', 'phone']
+PHOTO_COLUMN = 'photo'
+BATCH_SIZE = 200
+
+
+def read_csv(csv_path):
+    # Validate CSV rows the way the add dialog does.
+    # Returns (rows, errors): rows are (row number, contact, photo name),
+    # errors are (row number, message)
+    rows = []
+    errors = []
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        missing_headers = [col for col in REQUIRED_FIELDS if col not in (reader.fieldnames or [])]
+        if missing_headers:
+            raise ValueError(f"ستون‌های ضروری وجود ندارند: {', '.join(missing_headers)}")
+
+        for row_num, row in enumerate(reader, 1):
+            missing = [col for col in REQUIRED_FIELDS if not (row.get(col) or '').strip()]
+            if missing:
+                errors.append((row_num, f"فیلدهای خالی {', '.join(missing)}"))
+                continue
+            is_valid, formatted_phone = validate_phone(row['phone'])
+            if not is_valid:
+                errors.append((row_num, f"شماره تلفن نامعتبر - {row['phone']}"))
+                continue
+            contact = {col: (row.get(col) or '').strip() for col in IMPORT_COLUMNS}
+            contact['phone'] = formatted_phone
+            contact['photo_path'] = ''
+            rows.append((row_num, contact, (row.get(PHOTO_COLUMN) or '').strip()))
+    return rows, errors
+
+
+def _name_key(text):
+    # "Ali_Ahmadi", "ali-ahmadi" and "علی احمدی" style file stems -> one key
+    return normalize_text(text.replace('_', ' ').replace('-', ' ').replace('.', ' '))
+
+
+class PhotoSource:
+    # Images from a directory or a zip file, indexed by file name, phone and name.
+    # Zip members are extracted to a temporary directory only when matched.
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        self.extract_dir = tempfile.mkdtemp(prefix="phonebook-import-") if self.zip else None
+        self.by_name = {}
+        self.by_stem = {}
+        for name in self._names():
+            base = os.path.basename(name)
+            if base.startswith('.') or not base.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            stem = os.path.splitext(base)[0]
+            self.by_name.setdefault(base.lower(), name)
+            self.by_stem.setdefault(normalize_phone(stem) if any(c.isdigit() for c in stem) else _name_key(stem), name)
+
+    def _names(self):
+        if self.zip:
+            return [info.filename for info in self.zip.infolist() if not info.is_dir()]
+        names = []
+        for folder, dirs, files in os.walk(self.path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            names.extend(os.path.join(folder, name) for name in files)
+        return names
+
+    def match(self, contact, photo_name=''):
+        # Explicit photo column first, then phone, then "first last" / "last first"
+        if photo_name:
+            return self.by_name.get(os.path.basename(photo_name).lower())
+        for key in (contact['phone'],
+                    _name_key(f"{contact['first_name']} {contact['last_name']}"),
+                    _name_key(f"{contact['last_name']} {contact['first_name']}")):
+            if key in self.by_stem:
+                return self.by_stem[key]
+        return None
+
+    def local_path(self, name):
+        # Filesystem path for a matched image
+        if not self.zip:
+            return name
+        dest = os.path.join(self.extract_dir, f"{len(os.listdir(self.extract_dir))}{os.path.splitext(name)[1].lower()}")
+        with self.zip.open(name) as src, open(dest, 'wb') as out:
+            shutil.copyfileobj(src, out)
+        return dest
+
+    def close(self):
+        if self.zip:
+            self.zip.close()
+            shutil.rmtree(self.extract_dir, ignore_errors=True)
+
+
+def import_contacts(db, csv_path, photos_path=None, store=None, pipeline=None,
+                    thumbs=None, batch_size=BATCH_SIZE, progress=None, on_duplicate='skip'):
+    # Import a CSV and its photos in batches of batch_size rows: the batch's
+    # photos are processed on the image pool in parallel and stored, then its
+    # rows are inserted with import_many right away, so a stored photo is
+    # referenced well within the store's purge grace. Duplicates are skipped
+    # or (on_duplicate='update') written over the existing row.
+    # progress(stage, done, total) is called with stage 'photos' or 'rows'.
+    # Returns (added, duplicate row numbers, errors) where errors are
+    # (row number or file, message).
+    rows, errors = read_csv(csv_path)
+    contacts = [contact for _, contact, _ in rows]
+    store = store or PhotoStore(db)
+    own_pipeline = pipeline is None
+    pipeline = pipeline or ImagePipeline()
+    source = PhotoSource(photos_path) if photos_path else None
+
+    try:
+        # Image matched by each row; several rows can share one
+        photo_for = {}
+        if source:
+            for i, (row_num, contact, photo_name) in enumerate(rows):
+                name = source.match(contact, photo_name)
+                if name:
+                    photo_for[i] = name
+                elif photo_name:
+                    errors.append((row_num, f"فایل تصویر یافت نشد - {photo_name}"))
+        photo_total = len(set(photo_for.values()))
+        # name -> stored path, or None if it failed; each file is processed once
+        stored = {}
+
+        added = 0
+        duplicates = []
+        for start in range(0, len(contacts), batch_size):
+            batch_rows = [i for i in range(start, min(start + batch_size, len(contacts))) if i in photo_for]
+            new = {photo_for[i] for i in batch_rows} - stored.keys()
+            _store_photos(source, new, store, pipeline, thumbs, stored, errors)
+            if progress and new:
+                progress('photos', len(stored), photo_total)
+            for i in batch_rows:
+                contacts[i]['photo_path'] = stored[photo_for[i]] or ''
+            # Restart the grace of every photo the batch uses (some were stored
+            # for an earlier batch, or while the others were still processing)
+            store.touch({contacts[i]['photo_path'] for i in batch_rows} - {''})
+
+            batch = contacts[start:start + batch_size]
+            count, batch_duplicates, batch_errors = db.import_many(batch, on_duplicate)
+            added += count
+            duplicates.extend(rows[start + i][0] for i in batch_duplicates)
+            errors.extend((rows[start + i][0] if i is not None else None, message) for i, message in batch_errors)
+            if progress:
+                progress('rows', min(start + batch_size, len(contacts)), len(contacts))
+        return added, duplicates, errors
+    finally:
+        if source:
+            source.close()
+        if own_pipeline:
+            pipeline.shutdown()
+
+
+def _store_photos(source, names, store, pipeline, thumbs, stored, errors):
+    # Process and store the named images in parallel; records each in stored
+    local = {}
+    for name in names:
+        stored[name] = None
+        try:
+            local[source.local_path(name)] = name
+        except Exception as e:
+            errors.append((name, str(e)))
+
+    for path, result in pipeline.map(list(local)):
+        name = local[path]
+        if isinstance(result, Exception):
+            errors.append((name, str(result)))
+            continue
+        try:
+            stored[name] = store.put(result.path)
+            if thumbs is not None:
+                thumbs.put(stored[name], result.thumbnail)
+        except Exception as e:
+            errors.append((name, str(e)))
+        finally:
+            result.discard()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import contacts from CSV with photos")
+    parser.add_argument("csv", help="CSV file with first_name,last_name,group_name,phone[,position,email,photo]")
+    parser.add_argument("--photos", help="directory or zip of images")
+    parser.add_argument("--db", default="phonebook.db")
+    parser.add_argument("--store", default=PHOTOS_DIR, help="photo store directory")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--on-duplicate", choices=DUPLICATE_MODES, default="skip",
+                        help="skip rows whose key already exists, or update the existing contact")
+    args = parser.parse_args()
+
+    db = PhoneBookDB(args.db)
+
+    def report(stage, done, total):
+        print(f"\r{stage}: {done}/{total}", end="\n" if done == total else "", flush=True)
+
+    added, duplicates, errors = import_contacts(db, args.csv, args.photos, PhotoStore(db, args.store),
+                                                batch_size=args.batch, progress=report,
+                                                on_duplicate=args.on_duplicate)
+    print(f"Imported {added} contacts, {len(duplicates)} duplicates, {len(errors)} errors")
+    for where, message in errors:
+        print(f"  {where}: {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# photo_store.py - Content-addressed, reference-counted contact photos
+import argparse
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Where photos are stored; keep it on a volume, not the container layer
+PHOTOS_DIR = os.environ.get("PHONEBOOK_PHOTOS_DIR", "contact_photos")
+CHUNK_SIZE = 1024 * 1024
+# Freshly stored photos are not purged for this long, so a put() that is
+# about to be referenced by an add/update is never removed underneath it
+PURGE_GRACE_SECONDS = 60
+# sweep(): files modified more recently than this are never treated as orphans
+SWEEP_GRACE_SECONDS = 3600
+SWEEP_BATCH = 100
+SWEEP_PAUSE = 0.05
+# SweepScheduler: hours between sweeps of a running app
+SWEEP_INTERVAL = float(os.environ.get("PHONEBOOK_PHOTO_SWEEP_HOURS", "24")) * 3600
+# File in root naming the database the store belongs to (its settings
+# 'photo_store_id'); sweep() only runs on a root that names its database
+OWNER_FILE = ".phonebook-owner"
+OWNER_KEY = 'photo_store_id'
+
+
+class PhotoStore:
+    # Photos are stored once per content hash under root/<2 hex>/<sha256><ext>.
+    # The photos table (see PhoneBookDB._create_photo_refs) counts how many
+    # contacts reference each file; triggers on contacts keep the count
+    # current, and purge() deletes files nobody references any more.
+    # thumbs: optional PackedPhotoStore; purge() and sweep() drop the
+    # thumbnails of the files they remove so its compact() can reclaim them.
+    # The first put() into a root without an OWNER_FILE claims it for db.
+
+    def __init__(self, db, root=PHOTOS_DIR, thumbs=None):
+        self.db = db
+        self.root = root
+        self.thumbs = thumbs
+        os.makedirs(self.root, exist_ok=True)
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def put(self, src_path):
+        # Store a file (once per content) and return the path to save in photo_path
+        sha, size = self._hash_file(src_path)
+        ext = os.path.splitext(src_path)[1].lower()
+        folder = os.path.join(self.root, sha[:2])
+        dest = os.path.join(folder, sha + ext)
+        if self.owner() is None:
+            self.claim()
+
+        # Refresh the row first: from here on purge() leaves it (and the file)
+        # alone for its grace period, so the file checked below stays put
+        conn = self.db._get_conn()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO photos (path, sha256, size, refcount, created) VALUES (?, ?, ?, 0, ?) "
+                    "ON CONFLICT (path) DO UPDATE SET created = excluded.created",
+                    (dest, sha, size, time.time())
+                )
+        finally:
+            conn.close()
+
+        if not os.path.exists(dest):
+            os.makedirs(folder, exist_ok=True)
+            # Copy under a temporary name first so a crash never leaves a torn file
+            tmp = os.path.join(folder, f".{uuid.uuid4().hex}.tmp")
+            shutil.copyfile(src_path, tmp)
+            os.replace(tmp, dest)
+        return dest
+
+    def store_id(self):
+        # This database's photo store id (created on first use)
+        conn = self.db._get_conn()
+        try:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)",
+                             (OWNER_KEY, uuid.uuid4().hex))
+            return conn.execute("SELECT value FROM settings WHERE name = ?", (OWNER_KEY,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def owner(self):
+        # Store id recorded in root, or None if the root is unclaimed
+        try:
+            with open(os.path.join(self.root, OWNER_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def claim(self):
+        # Record this database as the owner of root; returns its store id
+        store_id = self.store_id()
+        tmp = os.path.join(self.root, f".{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(store_id + "\n")
+        os.replace(tmp, os.path.join(self.root, OWNER_FILE))
+        return store_id
+
+    def touch(self, paths):
+        # Restart the purge grace of stored photos that are about to be referenced
+        if not paths:
+            return
+        conn = self.db._get_conn()
+        try:
+            with conn:
+                conn.executemany("UPDATE photos SET created = ? WHERE path = ?",
+                                 [(time.time(), path) for path in paths])
+        finally:
+            conn.close()
+
+    def refcount(self, path):
+        # Number of contacts using a stored photo (None if not in the store)
+        conn = self.db._get_conn()
+        try:
+            row = conn.execute("SELECT refcount FROM photos WHERE path = ?", (path,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def purge(self, grace=PURGE_GRACE_SECONDS):
+        # Delete unreferenced photos; returns (files_removed, bytes_removed).
+        # Uses the partial index on refcount <= 0, never a scan of contacts.
+        conn = self.db._get_conn()
+        removed = 0
+        reclaimed = 0
+        cutoff = time.time() - grace
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            rows = cur.execute(
+                "SELECT path, size FROM photos WHERE refcount <= 0 AND created < ?",
+                (cutoff,)
+            ).fetchall()
+            for path, size in rows:
+                with conn:
+                    # Re-check inside the write: a contact may have just taken a
+                    # reference, or put() may have just stored the same content
+                    deleted = conn.execute(
+                        "DELETE FROM photos WHERE path = ? AND refcount <= 0 AND created < ?",
+                        (path, cutoff)
+                    ).rowcount
+                    if not deleted:
+                        continue
+                    # Unlink before the commit: a put() of the same content waits
+                    # on this write and then finds the file gone and copies it back
+                    try:
+                        os.remove(path)
+                        removed += 1
+                        reclaimed += size
+                    except FileNotFoundError:
+                        pass
+                if self.thumbs is not None:
+                    self.thumbs.delete(path)
+        finally:
+            conn.close()
+        return removed, reclaimed
+
+    def _referenced(self, conn):
+        # Real paths of every photo_path in contacts plus every file the store
+        # tracks (unreferenced store files are purge()'s job, with its own grace).
+        # Streamed from the cursor into a set; rows are never materialized.
+        cur = conn.cursor()
+        cur.row_factory = None
+        referenced = set()
+        for sql in ("SELECT DISTINCT photo_path FROM contacts WHERE photo_path IS NOT NULL AND photo_path != ''",
+                    "SELECT path FROM photos"):
+            for (path,) in cur.execute(sql):
+                referenced.add(os.path.realpath(path))
+        return referenced
+
+    def _still_referenced(self, conn, paths):
+        # Paths from a delete batch that a contact took in the meantime
+        placeholders = ", ".join("?" * len(paths))
+        rows = conn.execute(
+            f"SELECT photo_path FROM contacts WHERE photo_path IN ({placeholders}) "
+            f"UNION SELECT path FROM photos WHERE path IN ({placeholders})",
+            paths + paths
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def sweep(self, grace=SWEEP_GRACE_SECONDS, batch_size=SWEEP_BATCH, pause=SWEEP_PAUSE, dry_run=False):
+        # Delete files under root that nothing in the DB references (leftovers
+        # of the old uuid-named photos, replaced photos, crashed uploads), and
+        # work files (.incoming of imaging.ImagePipeline, .tmp copies) older
+        # than the grace. Deletes go in batches with a pause in between so the
+        # disk stays responsive.
+        # Returns (files_removed, bytes_removed). Raises ValueError if root
+        # isn't claimed by this database: its files may be another one's.
+        owner = self.owner()
+        if owner != self.store_id():
+            raise ValueError(f"{self.root} belongs to another database" if owner else
+                             f"{self.root} is not claimed by this database (photo_store.py claim)")
+        owner_file = os.path.join(self.root, OWNER_FILE)
+        conn = self.db._get_conn()
+        removed = 0
+        reclaimed = 0
+        try:
+            referenced = self._referenced(conn)
+            cutoff = time.time() - grace
+            batch = []
+
+            def flush():
+                nonlocal removed, reclaimed
+                taken = self._still_referenced(conn, [path for path, _ in batch])
+                for path, size in batch:
+                    if path in taken:
+                        continue
+                    if not dry_run:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            continue
+                        if self.thumbs is not None:
+                            self.thumbs.delete(path)
+                    removed += 1
+                    reclaimed += size
+                batch.clear()
+                if pause:
+                    time.sleep(pause)
+
+            for folder, _, files in os.walk(self.root):
+                for name in files:
+                    path = os.path.join(folder, name)
+                    if path == owner_file or os.path.realpath(path) in referenced:
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if st.st_mtime > cutoff:
+                        continue
+                    batch.append((path, st.st_size))
+                    if len(batch) >= batch_size:
+                        flush()
+            if batch:
+                flush()
+        finally:
+            conn.close()
+        return removed, reclaimed
+
+
+class SweepScheduler(threading.Thread):
+    # Runs store.sweep() now and then every `interval` seconds on a daemon
+    # thread; what each pass reclaimed is logged, failures are reported, not raised
+
+    def __init__(self, store, interval=SWEEP_INTERVAL):
+        super().__init__(name="photo-sweep", daemon=True)
+        self.store = store
+        self.interval = interval
+        self.last = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                self.last = self.store.sweep()
+                print(f"Photo sweep removed {self.last[0]} files, reclaimed {self.last[1]} bytes")
+            except ValueError as e:
+                print(f"Photo sweep skipped: {e}")
+            except Exception as e:
+                print(f"Photo sweep failed: {e}")
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    from database import PhoneBookDB
+
+    parser = argparse.ArgumentParser(description="Photo store maintenance")
+    parser.add_argument("command", choices=["purge", "sweep", "claim"])
+    parser.add_argument("--db", default="phonebook.db")
+    parser.add_argument("--root", default=PHOTOS_DIR, help="photo directory")
+    parser.add_argument("--grace", type=float, default=None, help="seconds; defaults per command")
+    parser.add_argument("--dry-run", action="store_true", help="sweep: report without deleting")
+    parser.add_argument("--thumbs", help="packed thumbnail cache to drop removed photos from")
+    args = parser.parse_args()
+
+    thumbs = None
+    if args.thumbs:
+        from packed_store import PackedPhotoStore
+        thumbs = PackedPhotoStore(args.thumbs)
+    store = PhotoStore(PhoneBookDB(args.db), args.root, thumbs)
+    if args.command == "claim":
+        # Mark root as this database's store (e.g. one from before ownership was recorded)
+        previous = store.owner()
+        store_id = store.claim()
+        print(f"{args.root} claimed for {args.db} ({store_id})" + (f", was {previous}" if previous else ""))
+        return
+    if args.command == "purge":
+        files, size = store.purge(PURGE_GRACE_SECONDS if args.grace is None else args.grace)
+    else:
+        try:
+            files, size = store.sweep(SWEEP_GRACE_SECONDS if args.grace is None else args.grace,
+                                      dry_run=args.dry_run)
+        except ValueError as e:
+            print(f"Not sweeping: {e}")
+            return
+    print(f"Removed {files} files, reclaimed {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# query_plans.py - Query-plan and latency regression checks for PhoneBookDB's hot queries
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from database import PhoneBookDB, SEARCH_FIELDS, SORT_FIELDS
+
+ROWS = 100000
+REPEAT = 5
+# Median latency budgets (ms) per query shape at ROWS contacts, whole result read
+BUDGETS_MS = {
+    'lookup': 5,
+    'search': 150,
+    'search contains': 1000,
+    'page': 20,
+    'list': 1500,
+}
+
+
+class TracedDB(PhoneBookDB):
+    # PhoneBookDB that records every statement its connections run
+    # (with the bound values filled in), so the checks see the real SQL
+
+    def __init__(self, *args, **kwargs):
+        self.statements = []
+        super().__init__(*args, **kwargs)
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def plan(db, sql):
+    # EXPLAIN QUERY PLAN detail lines for one statement
+    conn = db._connect()
+    conn.set_trace_callback(None)
+    try:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    finally:
+        conn.close()
+
+
+def plan_problems(details, expect):
+    # Rules: 'indexed' = no full scan of contacts; 'ordered' = rows come out
+    # in index order (no temp B-tree sort); 'scan' = a scan is expected
+    problems = []
+    if 'indexed' in expect:
+        problems += [d for d in details if d.startswith("SCAN contacts") and " INDEX " not in d]
+    if 'ordered' in expect:
+        problems += [d for d in details if "TEMP B-TREE" in d]
+    return problems
+
+
+def shapes(db):
+    # (name, budget key, plan expectations, callable) for every hot query shape
+    _, total = db.get_page('id', 0)
+    sample = db.get_page('id', 1, total // 2)[0][0]
+    values = {field: sample[field] for field in SEARCH_FIELDS}
+    # Half the value: selective, like a typed-in prefix (not "use" of every email)
+    prefixes = {field: value[:max(3, len(value) // 2)] for field, value in values.items()}
+
+    yield "get_by_id", 'lookup', {'indexed'}, lambda: db.get_by_id(sample['id'])
+    yield "get_by_phone", 'lookup', {'indexed'}, lambda: db.get_by_phone(sample['phone'])
+
+    for sort_by in SORT_FIELDS:
+        yield f"get_all sort={sort_by}", 'list', {'ordered'}, lambda s=sort_by: db.get_all(s)
+        yield f"get_page sort={sort_by}", 'page', {'ordered'}, lambda s=sort_by: db.get_page(s, 100, 5000)
+    yield "search (no filter)", 'list', {'ordered'}, lambda: db.search({})
+
+    # Every filter combination for the index-backed match modes
+    for size in range(1, len(SEARCH_FIELDS) + 1):
+        for fields in itertools.combinations(SEARCH_FIELDS, size):
+            for match, source in (('exact', values), ('prefix', prefixes)):
+                filters = {field: source[field] for field in fields}
+                yield (f"search {match} {'+'.join(fields)}", 'search', {'indexed'},
+                       lambda f=filters, m=match: db.search(f, match=m))
+    # Substring search scans by design; only its latency is checked
+    for field in SEARCH_FIELDS:
+        yield (f"search contains {field}", 'search contains', {'scan'},
+               lambda f=field: db.search({f: prefixes[f]}))
+
+
+def check(db, repeat=REPEAT, budgets=True):
+    # Run every shape; returns the list of failures
+    failures = []
+    for name, budget_key, expect, run in shapes(db):
+        db.statements.clear()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - start) * 1000)
+        statements = list(dict.fromkeys(s for s in db.statements if s.lstrip().upper().startswith("SELECT")))
+
+        problems = []
+        for sql in statements:
+            problems += plan_problems(plan(db, sql), expect)
+        median = statistics.median(times)
+        budget = BUDGETS_MS[budget_key]
+        if budgets and median > budget:
+            problems.append(f"{median:.1f} ms over the {budget} ms budget")
+
+        status = "FAIL" if problems else "ok"
+        print(f"{status:<4} | {median:8.2f} ms | {name}")
+        for problem in dict.fromkeys(problems):
+            print(f"       {problem}")
+        if problems:
+            failures.append((name, problems))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check query plans and latency budgets of the hot queries")
+    parser.add_argument("--rows", type=int, default=ROWS, help="synthetic contacts")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--no-budgets", action="store_true", help="check plans only (slow or shared machines)")
+    args = parser.parse_args()
+
+    from bench_replica import fill
+    with tempfile.TemporaryDirectory() as tmp:
+        db = TracedDB(os.path.join(tmp, "plans.db"), compact=True)
+        print(f"Loading {args.rows} synthetic contacts...")
+        fill(db, args.rows)
+        failures = check(db, args.repeat, budgets=not args.no_budgets)
+
+    print(f"\n{len(failures)} failing query shapes")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# replica.py - In-memory columnar read replica of the contacts table
+import bisect
+import threading
+from array import array
+from functools import partial
+from itertools import islice
+from operator import itemgetter
+
+from database import CONTACT_COLUMNS, ContactRecord, SELECT_COLUMNS, SEARCH_FIELDS, MATCH_MODES
+from normalize import normalize_field
+
+SEP = "\n"
+LOAD_CHUNK = 10000
+
+
+class ContactReplica:
+    # Contacts held column by column in slot order. Deleted slots are
+    # tombstoned and reclaimed by compact(). For searching, every field is
+    # also kept normalized (same as the *_norm columns) and as one
+    # SEP-delimited string in (last_name, id) order, so a filter is a few
+    # str.find() calls in C instead of a Python loop per row. Those blobs are
+    # rebuilt lazily after writes.
+
+    def __init__(self):
+        self.ids = array('q')
+        self.columns = {name: [] for name in CONTACT_COLUMNS[1:]}
+        self.folded = {name: [] for name in SEARCH_FIELDS}
+        self.alive = bytearray()
+        self.slot_of = {}
+        self.dead = 0
+        self._order = None
+        self._blobs = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, db):
+        # Build from the database, streaming rows from the cursor
+        replica = cls()
+        conn = db._get_conn()
+        try:
+            cur = conn.cursor()
+            cur.row_factory = None
+            cur.execute(f"SELECT {SELECT_COLUMNS} FROM contacts")
+            while True:
+                chunk = cur.fetchmany(LOAD_CHUNK)
+                if not chunk:
+                    break
+                replica._extend(chunk)
+        finally:
+            conn.close()
+        return replica
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    # ---- writes ----
+
+    def _extend(self, rows):
+        # Bulk append plain tuples in CONTACT_COLUMNS order
+        start = len(self.ids)
+        cols = list(zip(*rows))
+        self.ids.extend(cols[0])
+        for i, name in enumerate(CONTACT_COLUMNS[1:], start=1):
+            self.columns[name].extend(cols[i])
+        for name in SEARCH_FIELDS:
+            values = cols[CONTACT_COLUMNS.index(name)]
+            self.folded[name].extend(normalize_field(name, v) for v in values)
+        self.alive.extend(b"\x01" * len(rows))
+        self.slot_of.update(zip(cols[0], range(start, start + len(rows))))
+
+    def _append(self, rec):
+        slot = len(self.ids)
+        self.ids.append(rec[0])
+        for i, name in enumerate(CONTACT_COLUMNS[1:], start=1):
+            self.columns[name].append(rec[i])
+        for name in SEARCH_FIELDS:
+            self.folded[name].append(normalize_field(name, rec[name]))
+        self.alive.append(1)
+        self.slot_of[rec[0]] = slot
+
+    def _kill(self, contact_id):
+        slot = self.slot_of.pop(contact_id, None)
+        if slot is not None:
+            self.alive[slot] = 0
+            self.dead += 1
+
+    def apply(self, changes):
+        # PhoneBookDB change hook: list of (old, new) records
+        with self._lock:
+            self._apply(changes)
+
+    def _apply(self, changes):
+        for old, new in changes:
+            if new is None:
+                self._kill(old[0])
+                continue
+            slot = self.slot_of.get(new[0])
+            if slot is None:
+                self._append(new)
+                continue
+            for i, name in enumerate(CONTACT_COLUMNS[1:], start=1):
+                self.columns[name][slot] = new[i]
+            for name in SEARCH_FIELDS:
+                self.folded[name][slot] = normalize_field(name, new[name])
+
+        self._order = None
+        self._blobs = {}
+        if self.dead > 1000 and self.dead > len(self.slot_of):
+            self._compact()
+
+    def compact(self):
+        # Drop tombstoned slots
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        live = [slot for slot in range(len(self.ids)) if self.alive[slot]]
+        self.ids = array('q', (self.ids[s] for s in live))
+        self.columns = {name: [col[s] for s in live] for name, col in self.columns.items()}
+        self.folded = {name: [col[s] for s in live] for name, col in self.folded.items()}
+        self.alive = bytearray(b"\x01") * len(live)
+        self.slot_of = {cid: slot for slot, cid in enumerate(self.ids)}
+        self.dead = 0
+        self._order = None
+        self._blobs = {}
+
+    # ---- reads ----
+
+    def can_serve(self, filters, match='contains'):
+        # Anything unexpected is left to SQLite
+        if match not in MATCH_MODES:
+            return False
+        for key, value in (filters or {}).items():
+            if not value:
+                continue
+            if key not in SEARCH_FIELDS or not isinstance(value, str) or SEP in value:
+                return False
+        return True
+
+    def _sorted_slots(self):
+        # Live slots in the same order as the SQL path: ORDER BY last_name, id
+        if self._order is None:
+            last = self.columns['last_name']
+            ids = self.ids
+            self._order = sorted(
+                (slot for slot in range(len(ids)) if self.alive[slot]),
+                key=lambda slot: (last[slot], ids[slot])
+            )
+        return self._order
+
+    def _blob(self, field):
+        # (joined string, start offsets) for a field in sorted order
+        blob = self._blobs.get(field)
+        if blob is None:
+            col = self.folded[field]
+            values = [col[slot] for slot in self._sorted_slots()]
+            # starts[k] is the offset of the SEP in front of row k's value
+            starts = array('q')
+            pos = 0
+            for value in values:
+                starts.append(pos)
+                pos += len(value) + 1
+            blob = (SEP + SEP.join(values) + SEP, starts)
+            self._blobs[field] = blob
+        return blob
+
+    def _matching_ranks(self, field, needle, match):
+        # Yield positions (in sorted order) of rows whose field matches needle
+        text, starts = self._blob(field)
+        if match == 'prefix':
+            needle = SEP + needle
+        elif match == 'exact':
+            needle = SEP + needle + SEP
+        find = text.find
+        pos = find(needle)
+        while pos != -1:
+            rank = bisect.bisect_right(starts, pos) - 1
+            yield rank
+            # Skip the rest of this row; one hit per row is enough
+            if rank + 1 >= len(starts):
+                break
+            pos = find(needle, starts[rank + 1])
+
+    def search(self, filters, limit=None, offset=0, compact=False, match='contains'):
+        # Same results as PhoneBookDB.search's SQL path
+        with self._lock:
+            return self._search(filters, limit, offset, compact, match)
+
+    def _search(self, filters, limit, offset, compact, match):
+        active = [(key, normalize_field(key, value)) for key, value in (filters or {}).items() if value]
+        active = [(key, needle) for key, needle in active if needle]
+        order = self._sorted_slots()
+
+        if not active:
+            slots = iter(order)
+        else:
+            # Scan the longest needle's blob first; it usually matches fewest rows
+            active.sort(key=lambda kv: -len(kv[1]))
+            field, needle = active[0]
+            slots = (order[r] for r in self._matching_ranks(field, needle, match))
+            for field, needle in active[1:]:
+                slots = self._keep(slots, self.folded[field], needle, match)
+
+        # Lazy pipeline: a paged request stops scanning once the page is full
+        if limit is not None:
+            slots = islice(slots, offset, offset + limit)
+        return self._records(list(slots), compact)
+
+    @staticmethod
+    def _keep(slots, col, needle, match):
+        if match == 'exact':
+            return (slot for slot in slots if col[slot] == needle)
+        if match == 'prefix':
+            return (slot for slot in slots if col[slot].startswith(needle))
+        return (slot for slot in slots if needle in col[slot])
+
+    def _records(self, slots, compact):
+        # Materialize rows column-wise: one C-level gather per column
+        if not slots:
+            return []
+        if len(slots) == 1:
+            gathered = [[self.ids[slots[0]]]] + [[self.columns[name][slots[0]]] for name in CONTACT_COLUMNS[1:]]
+        else:
+            pick = itemgetter(*slots)
+            gathered = [pick(self.ids)] + [pick(self.columns[name]) for name in CONTACT_COLUMNS[1:]]
+        rows = zip(*gathered)
+        if compact:
+            return list(map(partial(tuple.__new__, ContactRecord), rows))
+        return [dict(zip(CONTACT_COLUMNS, row)) for row in rows]
@@ -0,0 +1,61 @@
+# storage.py - Which filesystem the data directories are on (container deployments)
+import os
+import re
+
+MOUNTINFO = "/proc/self/mountinfo"
+# Copy-on-write container layers: every first write copies the whole file up,
+# fsync is slow, and data is lost with the container
+SLOW_FILESYSTEMS = {"overlay", "aufs", "fuse.fuse-overlayfs"}
+_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def _unescape(field):
+    # mountinfo writes space, tab, newline and backslash as octal escapes
+    return _ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), field)
+
+
+def mounts(path=MOUNTINFO):
+    # [(mount point, filesystem type)] of this process, [] where there is no mountinfo
+    table = []
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split()
+                if "-" not in fields:
+                    continue
+                sep = fields.index("-")
+                table.append((_unescape(fields[4]), fields[sep + 1]))
+    except OSError:
+        pass
+    return table
+
+
+def filesystem_type(path, table=None):
+    # Type of the filesystem holding path (or its nearest existing parent), or None
+    table = mounts() if table is None else table
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    path = os.path.realpath(path)
+    best = None
+    for mount_point, fstype in table:
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        # Later entries stack on top of earlier ones at the same point
+        if inside and (best is None or len(mount_point) >= len(best[0])):
+            best = (mount_point, fstype)
+    return best[1] if best else None
+
+
+def check_data_dirs(paths):
+    # Print a warning for each {label: path} that is on a container layer
+    # instead of a volume; returns the warnings
+    table = mounts()
+    warnings = []
+    for label, path in paths.items():
+        fstype = filesystem_type(path, table)
+        if fstype in SLOW_FILESYSTEMS:
+            warnings.append(f"Warning: {label} at {os.path.abspath(path)} is on {fstype}; "
+                            f"mount a volume there or point its PHONEBOOK_* variable at one")
+    for warning in warnings:
+        print(warning)
+    return warnings